@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2014, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Compare `KeyValueList.put` and the collecting forms of `iterkeys` and
+`itervalues` against the original implementations for 10 to 10,000 pairs.
+Times per pair should stay roughly flat as the size grows.
+"""
+
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from urimagic.kvlist import KeyValueList
+
+
+def legacy_put(kvl, key, *values):
+    new_values = list(values)
+    kvl[:] = [
+        (k, value) if k != key else (k, new_values.pop(0))
+        for k, value in kvl
+        if k != key or new_values
+    ]
+    kvl.extend([(key, value) for value in new_values])
+
+
+def legacy_iterkeys(kvl):
+    keys = []
+    for k, v in kvl:
+        if k not in keys:
+            keys.append(k)
+            yield k
+
+
+def legacy_itervalues(kvl):
+    keys, values = [], []
+    for k, v in kvl:
+        try:
+            index = keys.index(k)
+        except ValueError:
+            keys.append(k)
+            values.append([v])
+        else:
+            values[index].append((v))
+    for value in values:
+        yield value
+
+
+def cases(size):
+    # Replace all but one of `size` repeated values, so that fewer values
+    # are put than exist; then collect over `size` distinct keys.
+    repeated = [("tag", str(i)) for i in range(size)]
+    values = [str(i) for i in range(size - 1)]
+    distinct = KeyValueList(("key{0}".format(i), i) for i in range(size))
+    return [
+        ("put",
+         lambda: legacy_put(KeyValueList(repeated), "tag", *values),
+         lambda: KeyValueList(repeated).put("tag", *values)),
+        ("iterkeys(collect)",
+         lambda: list(legacy_iterkeys(distinct)),
+         lambda: list(distinct.iterkeys(collect=True))),
+        ("itervalues(collect)",
+         lambda: list(legacy_itervalues(distinct)),
+         lambda: list(distinct.itervalues(collect=True))),
+    ]
+
+
+def best(function, number):
+    return min(repeat(function, number=number, repeat=3)) / number
+
+
+def main():
+    print("{0:<20} {1:>6} {2:>14} {3:>14} {4:>9}".format(
+        "operation", "pairs", "before/pair", "after/pair", "speedup"))
+    for size in (10, 100, 1000, 10000):
+        number = max(1, 10000 // size)
+        for name, before, after in cases(size):
+            slow, fast = best(before, number), best(after, number)
+            print("{0:<20} {1:>6} {2:>12.3f}us {3:>12.3f}us {4:>8.1f}x".format(
+                name, size, slow / size * 1e6, fast / size * 1e6, slow / fast))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2013-2014, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Compare the table-driven `percent_encode` against the original character by
+character implementation on ASCII-only and mixed-script input.
+"""
+
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from urimagic.rfc3986 import percent_encode, unreserved
+from urimagic.util import ustr
+
+
+def legacy_percent_encode(data, safe=None):
+    if not safe:
+        safe = ""
+    try:
+        chars = list(data)
+    except TypeError:
+        chars = list(ustr(data))
+    for i, char in enumerate(chars):
+        if char == "%" or (char not in unreserved and char not in safe):
+            chars[i] = "".join("%" + hex(b)[2:].upper().zfill(2)
+                               for b in bytearray(char, "utf-8"))
+    return "".join(chars)
+
+
+SAMPLES = [
+    ("ascii, nothing to encode", "report-2014_12_25.html", None),
+    ("ascii, some encoding", "Mulder & Scully: 20% of $100", None),
+    ("ascii, safe chars", "/data/reports/2014/summary report", "/"),
+    ("mixed script", "El Niño / Ελληνικά / 日本語のテキスト", None),
+]
+
+
+def main(number=100000):
+    for name, data, safe in SAMPLES:
+        assert percent_encode(data, safe) == legacy_percent_encode(data, safe)
+        before = min(repeat(lambda: legacy_percent_encode(data, safe),
+                            number=number, repeat=3))
+        after = min(repeat(lambda: percent_encode(data, safe),
+                           number=number, repeat=3))
+        print("{0:<28} {1:>8.3f}s {2:>8.3f}s {3:>7.1f}x".format(
+            name, before, after, before / after))
+
+
+if __name__ == "__main__":
+    main()
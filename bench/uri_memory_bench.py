@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2013-2014, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Report the memory held per parsed URI, excluding the source strings
+themselves, at four stages: straight after parsing, after reading the
+host, after serialising (which builds every component), after decoding the
+query parameters and after reading a query parameter (which also builds
+the index of parameter positions). The cost of that index is reported on
+its own, and the last stage is repeated with compact parameter storage.
+"""
+
+
+from __future__ import print_function, unicode_literals
+
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from urimagic import URI, Query
+from urimagic.kvlist import CompactKeyValueList, KeyValueList
+
+
+def sample_strings(count):
+    return ["https://user{0}@host{1}.example.com:8080/crawl/{0}/page.html"
+            "?session={0}&lang=en&ref=home&utm_source=feed&utm_medium=rss"
+            "&utm_campaign=spring{1}&page={0}#top".format(n, n % 100)
+            for n in range(count)]
+
+
+def measure(strings, touch):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    uris = [URI(string) for string in strings]
+    for uri in uris:
+        touch(uri)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Discount the list holding the URIs.
+    return (after - before - sys.getsizeof(uris)) / float(len(uris))
+
+
+def main(count=20000):
+    strings = sample_strings(count)
+    stages = [
+        ("parsed", lambda uri: None),
+        ("host read", lambda uri: uri.host),
+        ("fully built", lambda uri: uri.string),
+        ("parameters decoded", lambda uri: len(uri.query)),
+        ("parameter read", lambda uri: uri.query.get("lang")),
+    ]
+    sizes = {}
+    for name, touch in stages:
+        sizes[name] = measure(strings, touch)
+        print("{0:<24} {1:>8.0f} bytes/URI".format(name, sizes[name]))
+    print("{0:<24} {1:>8.0f} bytes/URI".format(
+        "  of which index",
+        sizes["parameter read"] - sizes["parameters decoded"]))
+    Query.parameter_list = CompactKeyValueList
+    try:
+        print("{0:<24} {1:>8.0f} bytes/URI".format(
+            "parameter read, compact",
+            measure(strings, lambda uri: uri.query.get("lang"))))
+    finally:
+        Query.parameter_list = KeyValueList
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2013-2014, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Compare interpreted and generated (`URITemplate.compile`) expansion over
+the RFC 6570 test vectors, then the public expansion methods for a simple
+template, with an f-string-style format as a baseline.
+"""
+
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+from collections import OrderedDict
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from urimagic import URITemplate
+
+
+VARIABLES = {
+    "count": ("one", "two", "three"),
+    "dom": ("example", "com"),
+    "dub": "me/too",
+    "hello": "Hello World!",
+    "half": "50%",
+    "var": "value",
+    "who": "fred",
+    "base": "http://example.com/home/",
+    "path": "/foo/bar",
+    "list": ("red", "green", "blue"),
+    "keys": OrderedDict([("semi", ";"), ("dot", "."), ("comma", ",")]),
+    "v": "6",
+    "x": "1024",
+    "y": "768",
+    "empty": "",
+    "empty_keys": dict([]),
+    "undef": None,
+}
+
+# RFC 6570 § 3.2, grouped by operator.
+TEMPLATES = OrderedDict([
+    ("simple", [
+        "{var}", "{hello}", "{half}", "O{empty}X", "O{undef}X", "{x,y}",
+        "{x,hello,y}", "?{x,empty}", "?{x,undef}", "?{undef,y}", "{var:3}",
+        "{var:30}", "{list}", "{list*}", "{keys}", "{keys*}",
+    ]),
+    ("reserved", [
+        "{+var}", "{+hello}", "{+half}", "{base}index", "{+base}index",
+        "O{+empty}X", "O{+undef}X", "{+path}/here", "here?ref={+path}",
+        "up{+path}{var}/here", "{+x,hello,y}", "{+path,x}/here",
+        "{+path:6}/here", "{+list}", "{+list*}", "{+keys}", "{+keys*}",
+    ]),
+    ("fragment", [
+        "{#var}", "{#hello}", "{#half}", "foo{#empty}", "foo{#undef}",
+        "{#x,hello,y}", "{#path,x}/here", "{#path:6}/here", "{#list}",
+        "{#list*}", "{#keys}", "{#keys*}",
+    ]),
+    ("label", [
+        "{.who}", "{.who,who}", "{.half,who}", "www{.dom*}", "X{.var}",
+        "X{.empty}", "X{.undef}", "X{.var:3}", "X{.list}", "X{.list*}",
+        "X{.keys}", "X{.keys*}", "X{.empty_keys}", "X{.empty_keys*}",
+    ]),
+    ("path segment", [
+        "{/who}", "{/who,who}", "{/half,who}", "{/who,dub}", "{/var}",
+        "{/var,empty}", "{/var,undef}", "{/var,x}/here", "{/var:1,var}",
+        "{/list}", "{/list*}", "{/list*,path:4}", "{/keys}", "{/keys*}",
+    ]),
+    ("path parameter", [
+        "{;who}", "{;half}", "{;empty}", "{;v,empty,who}", "{;v,bar,who}",
+        "{;x,y}", "{;x,y,empty}", "{;x,y,undef}", "{;hello:5}", "{;list}",
+        "{;list*}", "{;keys}", "{;keys*}",
+    ]),
+    ("form query", [
+        "{?who}", "{?half}", "{?x,y}", "{?x,y,empty}", "{?x,y,undef}",
+        "{?var:3}", "{?list}", "{?list*}", "{?keys}", "{?keys*}",
+    ]),
+    ("query continuation", [
+        "{&who}", "{&half}", "?fixed=yes{&x}", "{&x,y,empty}",
+        "{&x,y,undef}", "{&var:3}", "{&list}", "{&list*}", "{&keys}",
+        "{&keys*}",
+    ]),
+])
+
+
+def used(template):
+    # Only pass the variables a template could refer to, as a caller would.
+    return dict((name, value) for name, value in VARIABLES.items()
+                if name in template.string)
+
+
+def interpreted(template):
+    # The interpreted expansion, without the URI parse done by `expand`.
+    expand, values = template._URITemplate__expand, used(template)
+    return lambda: expand(values)
+
+
+def generated(template):
+    function, values = template.compile(), used(template)
+    return lambda: function(**values)
+
+
+def best(function, number):
+    return min(repeat(function, number=number, repeat=3))
+
+
+def main(number=20000):
+    print("{0:<20} {1:>10} {2:>10} {3:>8}".format(
+        "vectors", "interp", "compiled", "speedup"))
+    for group, templates in TEMPLATES.items():
+        before = after = 0.0
+        for string in templates:
+            template = URITemplate(string)
+            assert interpreted(template)() == generated(template)()
+            before += best(interpreted(template), number)
+            after += best(generated(template), number)
+        print("{0:<20} {1:>9.3f}s {2:>9.3f}s {3:>7.1f}x".format(
+            group, before, after, before / after))
+    template = URITemplate("/users/{user}/items/{item}")
+    user, item = "fred", "1024"
+    format_string = "/users/{0}/items/{1}".format
+    print()
+    print("/users/{user}/items/{item}")
+    for name, function in [
+        ("interpreted", lambda: template._URITemplate__expand(
+            {"user": user, "item": item})),
+        ("compiled", lambda: template.compile()(user=user, item=item)),
+        ("expand", lambda: template.expand(user=user, item=item)),
+        ("expand_string", lambda: template.expand_string(
+            user=user, item=item)),
+        ("expand_bytes", lambda: template.expand_bytes(
+            user=user, item=item)),
+        ("str.format", lambda: format_string(user, item)),
+    ]:
+        print("  {0:<18} {1:>9.3f}s".format(name, best(function, number)))
+
+
+if __name__ == "__main__":
+    main()
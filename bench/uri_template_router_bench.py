@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2013-2014, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Compare dispatching a path through a `URITemplateRouter` with trying each
+template's `match` in turn, for increasing numbers of API-style routes.
+"""
+
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from urimagic import URITemplate, URITemplateRouter
+
+
+def routes(count):
+    templates = []
+    for i in range(count // 4):
+        resource = "resource{0}".format(i)
+        templates.append("/api/v1/{0}".format(resource))
+        templates.append("/api/v1/{0}/{{id}}".format(resource))
+        templates.append("/api/v1/{0}/{{id}}/items{{?page,sort}}".format(
+            resource))
+        templates.append("/api/v1/{0}/{{id}}/items/{{item}}".format(resource))
+    return templates
+
+
+def linear(templates, uri):
+    for template in templates:
+        values = template.match(uri)
+        if values is not None:
+            return template, values
+    return None
+
+
+def best(function, number):
+    return min(repeat(function, number=number, repeat=3))
+
+
+def main(number=200):
+    print("{0:>8} {1:>10} {2:>10}".format("routes", "linear", "router"))
+    for count in (12, 120, 1200):
+        templates = [URITemplate(string) for string in routes(count)]
+        router = URITemplateRouter(templates).compile()
+        uri = "/api/v1/resource{0}/42/items?page=2".format(count // 4 - 1)
+        assert linear(templates, uri) == router.match(uri)
+        print("{0:>8} {1:>9.3f}s {2:>9.3f}s".format(
+            count, best(lambda: linear(templates, uri), number),
+            best(lambda: router.match(uri), number)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2013-2014, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import unicode_literals
+
+import codecs
+import io
+
+from urimagic import percent_decode, percent_encode
+
+
+ENCODED = "name=El+Ni%C3%B1o&note=20%25%20of%20%24100&x=%zz%4".encode("ascii")
+
+
+def _chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_can_encode_and_decode_with_codec():
+    assert codecs.encode("El Niño", "uri-percent") == b"El%20Ni%C3%B1o"
+    assert codecs.decode(b"El+Ni%C3%B1o", "uri-percent") == "El Niño"
+
+
+def test_codec_name_is_normalised():
+    assert codecs.lookup("URI_Percent").name == "uri-percent"
+
+
+def test_can_decode_in_chunks_of_every_size():
+    expected = percent_decode(ENCODED.decode("ascii"))
+    for size in range(1, len(ENCODED) + 1):
+        chunks = _chunked(ENCODED, size)
+        decoded = "".join(codecs.iterdecode(chunks, "uri-percent"))
+        assert decoded == expected
+
+
+def test_can_decode_memoryview_chunks():
+    view = memoryview(ENCODED)
+    decoder = codecs.getincrementaldecoder("uri-percent")()
+    decoded = "".join(decoder.decode(chunk) for chunk in _chunked(view, 3))
+    decoded += decoder.decode(b"", final=True)
+    assert decoded == percent_decode(ENCODED.decode("ascii"))
+
+
+def test_incomplete_trailing_escape_is_kept_when_final():
+    decoder = codecs.getincrementaldecoder("uri-percent")()
+    assert decoder.decode(b"100%") == "100"
+    assert decoder.decode(b"", final=True) == "%"
+
+
+def test_incomplete_trailing_character_fails_when_final():
+    decoder = codecs.getincrementaldecoder("uri-percent")()
+    assert decoder.decode(b"Ni%C3") == "Ni"
+    try:
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        assert True
+    else:
+        assert False
+
+
+def test_decoder_state_can_be_saved_and_restored():
+    decoder = codecs.getincrementaldecoder("uri-percent")()
+    decoder.decode(b"Ni%C3%B")
+    state = decoder.getstate()
+    restored = codecs.getincrementaldecoder("uri-percent")()
+    restored.setstate(state)
+    assert restored.decode(b"1o", final=True) == "ño"
+
+
+def test_can_encode_in_chunks():
+    text = "Mulder & Scully / El Niño"
+    encoded = b"".join(codecs.iterencode(list(text), "uri-percent"))
+    assert encoded == percent_encode(text).encode("ascii")
+
+
+def test_can_stream_through_text_wrapper():
+    stream = io.TextIOWrapper(io.BytesIO(ENCODED), encoding="uri-percent")
+    assert stream.read(4) == "name"
+    assert stream.read() == percent_decode(ENCODED.decode("ascii"))[4:]
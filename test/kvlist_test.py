@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2014, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import unicode_literals
+
+from urimagic.kvlist import CompactKeyValueList, KeyValueList
+
+
+def _kvl():
+    return KeyValueList([("red", "rose"), ("blue", "sea"),
+                         ("green", "grass"), ("blue", "sky")])
+
+
+def test_lookups_follow_appends():
+    kvl = _kvl()
+    assert list(kvl.get("blue")) == ["sea", "sky"]
+    kvl.append("blue", "jeans")
+    kvl.append("yellow", "sun")
+    assert list(kvl.get("blue")) == ["sea", "sky", "jeans"]
+    assert kvl.has_key("yellow")
+    assert kvl.has_item("yellow", "sun")
+
+
+def test_lookups_follow_insert_and_setitem():
+    kvl = _kvl()
+    assert kvl.has_key("blue")
+    kvl.insert(0, "blue", "jeans")
+    kvl[2] = ("yellow", "sun")
+    assert list(kvl.get("blue")) == ["jeans", "sky"]
+    assert list(kvl.get("yellow")) == ["sun"]
+
+
+def test_lookups_follow_slices_sort_and_reverse():
+    kvl = _kvl()
+    assert kvl.has_key("green")
+    kvl[1:3] = [("green", "leaf")]
+    assert list(kvl.get("green")) == ["leaf"]
+    assert not kvl.has_item("blue", "sea")
+    kvl.reverse()
+    assert list(kvl.get("blue")) == ["sky"]
+    kvl.sort()
+    assert list(kvl) == [("blue", "sky"), ("green", "leaf"), ("red", "rose")]
+    del kvl[:2]
+    assert not kvl.has_key("blue")
+
+
+def test_lookups_follow_pop_put_and_remove():
+    kvl = _kvl()
+    assert kvl.pop() == ("blue", "sky")
+    assert list(kvl.get("blue")) == ["sea"]
+    kvl.pop(0)
+    assert not kvl.has_key("red")
+    kvl.put("green", "leaf", "moss")
+    assert list(kvl.get("green")) == ["leaf", "moss"]
+    kvl.remove("green")
+    assert list(kvl) == [("blue", "sea")]
+    kvl += [("blue", "sky")]
+    assert list(kvl.get("blue")) == ["sea", "sky"]
+
+
+def test_lists_without_an_index_keep_no_attributes():
+    kvl = _kvl()
+    kvl.insert(0, "blue", "jeans")
+    kvl.sort()
+    kvl.reverse()
+    kvl.pop(1)
+    del kvl[0]
+    assert kvl.__dict__ == {}
+
+
+def test_unhashable_keys_are_searched_linearly():
+    kvl = KeyValueList([(["a"], 1), ("b", 2)])
+    assert kvl.has_key(["a"])
+    assert kvl.has_key("b")
+    assert list(kvl.get(["a"])) == [1]
+    kvl.append("c", 3)
+    assert kvl.has_item("c", 3)
+
+
+def test_put_with_fewer_values_than_items():
+    kvl = _kvl()
+    kvl.put("blue", "jeans")
+    assert list(kvl) == [("red", "rose"), ("blue", "jeans"),
+                         ("green", "grass")]
+
+
+def test_put_with_more_values_than_items_after_lookup():
+    kvl = _kvl()
+    assert kvl.has_key("blue")
+    kvl.put("blue", "jeans", "whale", "moon")
+    assert list(kvl) == [("red", "rose"), ("blue", "jeans"),
+                         ("green", "grass"), ("blue", "whale"),
+                         ("blue", "moon")]
+    assert list(kvl.get("blue")) == ["jeans", "whale", "moon"]
+
+
+def test_put_in_place_keeps_existing_keys():
+    key = 1.0
+    kvl = KeyValueList([(key, "a"), ("b", "c")])
+    assert kvl.has_key(1)
+    kvl.put(1, "d")
+    assert list(kvl) == [(1.0, "d"), ("b", "c")]
+    assert kvl[0][0] is key
+
+
+def test_collect_with_unhashable_keys():
+    kvl = KeyValueList([(["a"], 1), ("b", 2), (["a"], 3)])
+    assert list(kvl.iterkeys(collect=True)) == [["a"], "b"]
+    assert list(kvl.itervalues(collect=True)) == [[1, 3], [2]]
+    assert list(kvl.iteritems(collect=True)) == [(["a"], [1, 3]), ("b", [2])]
+
+
+def test_compact_list_behaves_like_key_value_list():
+    kvl, compact = _kvl(), CompactKeyValueList(_kvl())
+    assert compact == kvl
+    for lst in (kvl, compact):
+        lst.append("blue", "jeans")
+        lst.put("blue", "sky")
+        lst.insert(1, "grey", "stone")
+        lst[0] = ("red", "berry")
+        lst.sort()
+    assert list(compact) == list(kvl)
+    assert list(compact.get("blue")) == ["sky"]
+    assert compact.has_item("grey", "stone")
+    assert list(compact.iteritems(collect=True)) == \
+        list(kvl.iteritems(collect=True))
+
+
+def test_compact_list_slices_are_compact():
+    compact = CompactKeyValueList(_kvl())
+    assert isinstance(compact[1:3], CompactKeyValueList)
+    assert compact[1:3] == [("blue", "sea"), ("green", "grass")]
+
+
+def test_compact_list_interns_keys():
+    key = str("".join(["utm_", "source"]))
+    first = CompactKeyValueList([(key, 1)])
+    second = CompactKeyValueList([(str("utm_source"), 2)])
+    assert next(first.iterkeys()) is next(second.iterkeys())
+
+
+def test_compact_list_is_not_equal_to_non_iterables():
+    compact = CompactKeyValueList(_kvl())
+    assert compact != 1
+    assert not compact == None
+    assert compact == list(_kvl())
+
+
+def test_compact_list_remove_missing_key():
+    compact = CompactKeyValueList(_kvl())
+    try:
+        compact.remove("yellow")
+    except ValueError:
+        assert True
+    else:
+        assert False
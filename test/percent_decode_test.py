@@ -18,7 +18,7 @@
 
 from __future__ import unicode_literals
 
-from urimagic import percent_decode
+from urimagic import percent_decode, percent_decode_bytes
 
 
 def test_can_percent_decode_none():
@@ -63,3 +63,47 @@ def test_percent_decoding_partial_extended_chars_will_fail():
         assert True
     else:
         assert False
+
+
+def test_string_without_escapes_is_returned_unchanged():
+    data = "nothing-to-decode"
+    decoded = percent_decode(data)
+    assert decoded is data
+
+
+def test_can_percent_decode_lower_and_mixed_case_escapes():
+    decoded = percent_decode("%2f%2F%c3%B1")
+    assert decoded == "//ñ"
+
+
+def test_invalid_escapes_are_left_alone():
+    decoded = percent_decode("100%+%zz%4")
+    assert decoded == "100% %zz%4"
+
+
+def test_encoded_plus_is_not_decoded_to_space():
+    decoded = percent_decode("1%2B1+=+2")
+    assert decoded == "1+1 = 2"
+
+
+def test_can_percent_decode_bytes():
+    decoded = percent_decode_bytes(b"El%20Ni%C3%B1o+%zz")
+    assert decoded == bytearray("El Niño %zz".encode("utf-8"))
+
+
+def test_can_percent_decode_bytearray():
+    decoded = percent_decode_bytes(bytearray(b"one+two%20three"))
+    assert decoded == bytearray(b"one two three")
+
+
+def test_can_percent_decode_memoryview():
+    data = memoryview(b"GET /El%20Ni%C3%B1o+%zz%4 HTTP/1.1")[4:-9]
+    decoded = percent_decode_bytes(data)
+    assert decoded == bytearray("/El Niño %zz%4".encode("utf-8"))
+
+
+def test_can_percent_decode_bytes_into_existing_buffer():
+    out = bytearray(b"/")
+    returned = percent_decode_bytes(b"a%2Fb", out=out)
+    assert returned is out
+    assert out == bytearray(b"/a/b")
@@ -23,7 +23,7 @@ try:
 except ImportError:
     from .util.ordereddict import OrderedDict
 
-from urimagic import percent_encode
+from urimagic import Encoded, percent_encode, percent_encode_bytes
 
 
 def test_can_percent_encode_none():
@@ -69,3 +69,77 @@ def test_can_percent_encode_extended_chars():
 def test_can_percent_encode_with_safe_chars():
     encoded = percent_encode("/El Niño/", safe="/|\\")
     assert encoded == "/El%20Ni%C3%B1o/"
+
+
+def test_can_percent_encode_with_regex_special_safe_chars():
+    encoded = percent_encode("a-]^\\b c", safe="-]^\\")
+    assert encoded == "a-]^\\b%20c"
+
+
+def test_can_percent_encode_with_non_ascii_safe_chars():
+    encoded = percent_encode("/El Niño/", safe="ñ/")
+    assert encoded == "/El%20Niño/"
+
+
+def test_percent_sign_is_always_encoded():
+    encoded = percent_encode("100%", safe="%")
+    assert encoded == "100%25"
+
+
+def test_percent_encoding_with_same_safe_chars_is_repeatable():
+    first = percent_encode("a/b c", safe="/")
+    second = percent_encode("a/b c", safe="/")
+    assert first == second == "a/b%20c"
+
+
+def test_percent_encoding_every_ascii_char():
+    data = "".join(chr(n) for n in range(128))
+    encoded = percent_encode(data)
+    for n in range(128):
+        char = chr(n)
+        if char.isalnum() or char in "-._~":
+            assert char in encoded
+        else:
+            assert "%{0:02X}".format(n) in encoded
+
+
+def test_can_percent_encode_bytes():
+    encoded = percent_encode_bytes("/El Niño/".encode("utf-8"))
+    assert encoded == bytearray(b"%2FEl%20Ni%C3%B1o%2F")
+
+
+def test_can_percent_encode_bytes_with_safe_chars():
+    encoded = percent_encode_bytes(b"/data/my report", safe="/")
+    assert encoded == bytearray(b"/data/my%20report")
+
+
+def test_can_percent_encode_bytearray_and_memoryview():
+    data = bytearray(b"knife&fork")
+    assert percent_encode_bytes(data) == bytearray(b"knife%26fork")
+    assert percent_encode_bytes(memoryview(data)) == bytearray(b"knife%26fork")
+
+
+def test_can_percent_encode_bytes_into_existing_buffer():
+    out = bytearray(b"GET /")
+    returned = percent_encode_bytes(b"a b", out=out)
+    assert returned is out
+    assert out == bytearray(b"GET /a%20b")
+
+
+def test_encoded_values_are_passed_through():
+    encoded = Encoded("a%2Fb%20c")
+    assert percent_encode(encoded) is encoded
+
+
+def test_encoded_values_may_contain_safe_characters():
+    assert percent_encode(Encoded("a/b"), safe="/") == "a/b"
+
+
+def test_encoded_values_with_illegal_characters_are_rejected():
+    for value in ("a/b", "100%", "50%2", "café"):
+        try:
+            percent_encode(Encoded(value))
+        except ValueError:
+            assert True
+        else:
+            assert False
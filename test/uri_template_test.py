@@ -18,12 +18,19 @@
 
 from __future__ import unicode_literals
 
+from io import StringIO
+from pickle import dumps, loads
+
 try:
     from collections import OrderedDict
 except ImportError:
     from .util.ordereddict import OrderedDict
+try:
+    from types import MappingProxyType
+except ImportError:
+    MappingProxyType = dict
 
-from urimagic import URI, URITemplate
+from urimagic import Encoded, URI, URITemplate, URITemplateRouter
 
 
 def test_expansion_with_no_variables():
@@ -59,157 +66,230 @@ def _test_expansions(expansions):
         assert uri == expansion
 
 
+EMPTY_EXPANSIONS = {
+    None: None,
+    "": "",
+}
+
+
 def test_empty_expansion():
-    _test_expansions({
-        None: None,
-        "": "",
-    })
+    _test_expansions(EMPTY_EXPANSIONS)
+
+
+SIMPLE_STRING_EXPANSIONS = {
+    "{var}": "value",
+    "{hello}": "Hello%20World%21",
+    "{half}": "50%25",
+    "O{empty}X": "OX",
+    "O{undef}X": "OX",
+    "{x,y}": "1024,768",
+    "{x,hello,y}": "1024,Hello%20World%21,768",
+    "?{x,empty}": "?1024,",
+    "?{x,undef}": "?1024",
+    "?{undef,y}": "?768",
+    "{var:3}": "val",
+    "{var:30}": "value",
+    "{list}": "red,green,blue",
+    "{list*}": "red,green,blue",
+    "{keys}": "semi,%3B,dot,.,comma,%2C",
+    "{keys*}": "semi=%3B,dot=.,comma=%2C",
+}
 
 
 def test_can_expand_simple_strings():
-    _test_expansions({
-        "{var}": "value",
-        "{hello}": "Hello%20World%21",
-        "{half}": "50%25",
-        "O{empty}X": "OX",
-        "O{undef}X": "OX",
-        "{x,y}": "1024,768",
-        "{x,hello,y}": "1024,Hello%20World%21,768",
-        "?{x,empty}": "?1024,",
-        "?{x,undef}": "?1024",
-        "?{undef,y}": "?768",
-        "{var:3}": "val",
-        "{var:30}": "value",
-        "{list}": "red,green,blue",
-        "{list*}": "red,green,blue",
-        "{keys}": "semi,%3B,dot,.,comma,%2C",
-        "{keys*}": "semi=%3B,dot=.,comma=%2C",
-    })
+    _test_expansions(SIMPLE_STRING_EXPANSIONS)
+
+
+RESERVED_STRING_EXPANSIONS = {
+    "{+var}": "value",
+    "{+hello}": "Hello%20World!",
+    "{+half}": "50%25",
+    "{base}index": "http%3A%2F%2Fexample.com%2Fhome%2Findex",
+    "{+base}index": "http://example.com/home/index",
+    "O{+empty}X": "OX",
+    "O{+undef}X": "OX",
+    "{+path}/here": "/foo/bar/here",
+    "here?ref={+path}": "here?ref=/foo/bar",
+    "up{+path}{var}/here": "up/foo/barvalue/here",
+    "{+x,hello,y}": "1024,Hello%20World!,768",
+    "{+path,x}/here": "/foo/bar,1024/here",
+    "{+path:6}/here": "/foo/b/here",
+    "{+list}": "red,green,blue",
+    "{+list*}": "red,green,blue",
+    "{+keys}": "semi,;,dot,.,comma,,",
+    "{+keys*}": "semi=;,dot=.,comma=,",
+}
 
 
 def test_can_expand_reserved_strings():
-    _test_expansions({
-        "{+var}": "value",
-        "{+hello}": "Hello%20World!",
-        "{+half}": "50%25",
-        "{base}index": "http%3A%2F%2Fexample.com%2Fhome%2Findex",
-        "{+base}index": "http://example.com/home/index",
-        "O{+empty}X": "OX",
-        "O{+undef}X": "OX",
-        "{+path}/here": "/foo/bar/here",
-        "here?ref={+path}": "here?ref=/foo/bar",
-        "up{+path}{var}/here": "up/foo/barvalue/here",
-        "{+x,hello,y}": "1024,Hello%20World!,768",
-        "{+path,x}/here": "/foo/bar,1024/here",
-        "{+path:6}/here": "/foo/b/here",
-        "{+list}": "red,green,blue",
-        "{+list*}": "red,green,blue",
-        "{+keys}": "semi,;,dot,.,comma,,",
-        "{+keys*}": "semi=;,dot=.,comma=,",
-    })
+    _test_expansions(RESERVED_STRING_EXPANSIONS)
+
+
+FRAGMENT_EXPANSIONS = {
+    "{#var}": "#value",
+    "{#hello}": "#Hello%20World!",
+    "{#half}": "#50%25",
+    "foo{#empty}": "foo#",
+    "foo{#undef}": "foo",
+    "{#x,hello,y}": "#1024,Hello%20World!,768",
+    "{#path,x}/here": "#/foo/bar,1024/here",
+    "{#path:6}/here": "#/foo/b/here",
+    "{#list}": "#red,green,blue",
+    "{#list*}": "#red,green,blue",
+    "{#keys}": "#semi,;,dot,.,comma,,",
+    "{#keys*}": "#semi=;,dot=.,comma=,",
+}
 
 
 def test_can_expand_fragments():
-    _test_expansions({
-        "{#var}": "#value",
-        "{#hello}": "#Hello%20World!",
-        "{#half}": "#50%25",
-        "foo{#empty}": "foo#",
-        "foo{#undef}": "foo",
-        "{#x,hello,y}": "#1024,Hello%20World!,768",
-        "{#path,x}/here": "#/foo/bar,1024/here",
-        "{#path:6}/here": "#/foo/b/here",
-        "{#list}": "#red,green,blue",
-        "{#list*}": "#red,green,blue",
-        "{#keys}": "#semi,;,dot,.,comma,,",
-        "{#keys*}": "#semi=;,dot=.,comma=,",
-    })
+    _test_expansions(FRAGMENT_EXPANSIONS)
+
+
+LABEL_EXPANSIONS = {
+    "{.who}": ".fred",
+    "{.who,who}": ".fred.fred",
+    "{.half,who}": ".50%25.fred",
+    "www{.dom*}": "www.example.com",
+    "X{.var}": "X.value",
+    "X{.empty}": "X.",
+    "X{.undef}": "X",
+    "X{.var:3}": "X.val",
+    "X{.list}": "X.red,green,blue",
+    "X{.list*}": "X.red.green.blue",
+    "X{.keys}": "X.semi,%3B,dot,.,comma,%2C",
+    "X{.keys*}": "X.semi=%3B.dot=..comma=%2C",
+    "X{.empty_keys}": "X",
+    "X{.empty_keys*}": "X",
+}
 
 
 def test_can_expand_labels():
-    _test_expansions({
-        "{.who}": ".fred",
-        "{.who,who}": ".fred.fred",
-        "{.half,who}": ".50%25.fred",
-        "www{.dom*}": "www.example.com",
-        "X{.var}": "X.value",
-        "X{.empty}": "X.",
-        "X{.undef}": "X",
-        "X{.var:3}": "X.val",
-        "X{.list}": "X.red,green,blue",
-        "X{.list*}": "X.red.green.blue",
-        "X{.keys}": "X.semi,%3B,dot,.,comma,%2C",
-        "X{.keys*}": "X.semi=%3B.dot=..comma=%2C",
-        "X{.empty_keys}": "X",
-        "X{.empty_keys*}": "X",
-    })
+    _test_expansions(LABEL_EXPANSIONS)
+
+
+PATH_SEGMENT_EXPANSIONS = {
+    "{/who}": "/fred",
+    "{/who,who}": "/fred/fred",
+    "{/half,who}": "/50%25/fred",
+    "{/who,dub}": "/fred/me%2Ftoo",
+    "{/var}": "/value",
+    "{/var,empty}": "/value/",
+    "{/var,undef}": "/value",
+    "{/var,x}/here": "/value/1024/here",
+    "{/var:1,var}": "/v/value",
+    "{/list}": "/red,green,blue",
+    "{/list*}": "/red/green/blue",
+    "{/list*,path:4}": "/red/green/blue/%2Ffoo",
+    "{/keys}": "/semi,%3B,dot,.,comma,%2C",
+    "{/keys*}": "/semi=%3B/dot=./comma=%2C",
+}
 
 
 def test_can_expand_path_segments():
-    _test_expansions({
-        "{/who}": "/fred",
-        "{/who,who}": "/fred/fred",
-        "{/half,who}": "/50%25/fred",
-        "{/who,dub}": "/fred/me%2Ftoo",
-        "{/var}": "/value",
-        "{/var,empty}": "/value/",
-        "{/var,undef}": "/value",
-        "{/var,x}/here": "/value/1024/here",
-        "{/var:1,var}": "/v/value",
-        "{/list}": "/red,green,blue",
-        "{/list*}": "/red/green/blue",
-        "{/list*,path:4}": "/red/green/blue/%2Ffoo",
-        "{/keys}": "/semi,%3B,dot,.,comma,%2C",
-        "{/keys*}": "/semi=%3B/dot=./comma=%2C",
-    })
+    _test_expansions(PATH_SEGMENT_EXPANSIONS)
+
+
+PATH_PARAMETER_EXPANSIONS = {
+    "{;who}": ";who=fred",
+    "{;half}": ";half=50%25",
+    "{;empty}": ";empty",
+    "{;v,empty,who}": ";v=6;empty;who=fred",
+    "{;v,bar,who}": ";v=6;who=fred",
+    "{;x,y}": ";x=1024;y=768",
+    "{;x,y,empty}": ";x=1024;y=768;empty",
+    "{;x,y,undef}": ";x=1024;y=768",
+    "{;hello:5}": ";hello=Hello",
+    "{;list}": ";list=red,green,blue",
+    "{;list*}": ";list=red;list=green;list=blue",
+    "{;keys}": ";keys=semi,%3B,dot,.,comma,%2C",
+    "{;keys*}": ";semi=%3B;dot=.;comma=%2C",
+}
 
 
 def test_can_expand_path_parameters():
-    _test_expansions({
-        "{;who}": ";who=fred",
-        "{;half}": ";half=50%25",
-        "{;empty}": ";empty",
-        "{;v,empty,who}": ";v=6;empty;who=fred",
-        "{;v,bar,who}": ";v=6;who=fred",
-        "{;x,y}": ";x=1024;y=768",
-        "{;x,y,empty}": ";x=1024;y=768;empty",
-        "{;x,y,undef}": ";x=1024;y=768",
-        "{;hello:5}": ";hello=Hello",
-        "{;list}": ";list=red,green,blue",
-        "{;list*}": ";list=red;list=green;list=blue",
-        "{;keys}": ";keys=semi,%3B,dot,.,comma,%2C",
-        "{;keys*}": ";semi=%3B;dot=.;comma=%2C",
-    })
+    _test_expansions(PATH_PARAMETER_EXPANSIONS)
+
+
+FORM_QUERY_EXPANSIONS = {
+    "{?who}": "?who=fred",
+    "{?half}": "?half=50%25",
+    "{?x,y}": "?x=1024&y=768",
+    "{?x,y,empty}": "?x=1024&y=768&empty=",
+    "{?x,y,undef}": "?x=1024&y=768",
+    "{?var:3}": "?var=val",
+    "{?list}": "?list=red,green,blue",
+    "{?list*}": "?list=red&list=green&list=blue",
+    "{?keys}": "?keys=semi,%3B,dot,.,comma,%2C",
+    "{?keys*}": "?semi=%3B&dot=.&comma=%2C",
+}
 
 
 def test_can_expand_form_queries():
-    _test_expansions({
-        "{?who}": "?who=fred",
-        "{?half}": "?half=50%25",
-        "{?x,y}": "?x=1024&y=768",
-        "{?x,y,empty}": "?x=1024&y=768&empty=",
-        "{?x,y,undef}": "?x=1024&y=768",
-        "{?var:3}": "?var=val",
-        "{?list}": "?list=red,green,blue",
-        "{?list*}": "?list=red&list=green&list=blue",
-        "{?keys}": "?keys=semi,%3B,dot,.,comma,%2C",
-        "{?keys*}": "?semi=%3B&dot=.&comma=%2C",
-    })
+    _test_expansions(FORM_QUERY_EXPANSIONS)
+
+
+FORM_QUERY_CONTINUATION_EXPANSIONS = {
+    "{&who}": "&who=fred",
+    "{&half}": "&half=50%25",
+    "?fixed=yes{&x}": "?fixed=yes&x=1024",
+    "{&x,y,empty}": "&x=1024&y=768&empty=",
+    "{&x,y,undef}": "&x=1024&y=768",
+    "{&var:3}": "&var=val",
+    "{&list}": "&list=red,green,blue",
+    "{&list*}": "&list=red&list=green&list=blue",
+    "{&keys}": "&keys=semi,%3B,dot,.,comma,%2C",
+    "{&keys*}": "&semi=%3B&dot=.&comma=%2C",
+}
 
 
 def test_can_expand_form_query_continuations():
-    _test_expansions({
-        "{&who}": "&who=fred",
-        "{&half}": "&half=50%25",
-        "?fixed=yes{&x}": "?fixed=yes&x=1024",
-        "{&x,y,empty}": "&x=1024&y=768&empty=",
-        "{&x,y,undef}": "&x=1024&y=768",
-        "{&var:3}": "&var=val",
-        "{&list}": "&list=red,green,blue",
-        "{&list*}": "&list=red&list=green&list=blue",
-        "{&keys}": "&keys=semi,%3B,dot,.,comma,%2C",
-        "{&keys*}": "&semi=%3B&dot=.&comma=%2C",
-    })
+    _test_expansions(FORM_QUERY_CONTINUATION_EXPANSIONS)
+
+
+RFC_VARIABLES = {
+    "count": ("one", "two", "three"),
+    "dom": ("example", "com"),
+    "dub": "me/too",
+    "hello": "Hello World!",
+    "half": "50%",
+    "var": "value",
+    "who": "fred",
+    "base": "http://example.com/home/",
+    "path": "/foo/bar",
+    "list": ("red", "green", "blue"),
+    "keys": OrderedDict([("semi", ";"), ("dot", "."), ("comma", ",")]),
+    "v": "6",
+    "x": "1024",
+    "y": "768",
+    "empty": "",
+    "empty_keys": dict([]),
+    "undef": None,
+}
+
+RFC_EXPANSIONS = (EMPTY_EXPANSIONS, SIMPLE_STRING_EXPANSIONS,
+                  RESERVED_STRING_EXPANSIONS, FRAGMENT_EXPANSIONS,
+                  LABEL_EXPANSIONS, PATH_SEGMENT_EXPANSIONS,
+                  PATH_PARAMETER_EXPANSIONS, FORM_QUERY_EXPANSIONS,
+                  FORM_QUERY_CONTINUATION_EXPANSIONS)
+
+
+def test_compiled_templates_expand_rfc_examples():
+    for expansions in RFC_EXPANSIONS:
+        for template, expansion in expansions.items():
+            compiled = URITemplate(template).compile()
+            assert URI(compiled(**RFC_VARIABLES)) == expansion
+
+
+def test_partial_templates_expand_rfc_examples():
+    for expansions in RFC_EXPANSIONS:
+        for template, expansion in expansions.items():
+            if template is None:
+                continue
+            for name in ("x", "list", "keys", "empty", "undef"):
+                rest = dict(RFC_VARIABLES)
+                partial = URITemplate(template).partial(
+                    **{name: rest.pop(name)})
+                assert URI(partial.compile()(**rest)) == expansion
 
 
 def test_can_parse_none_uri_template():
@@ -252,3 +332,558 @@ def test_uri_template_is_hashable():
     template = URITemplate("http://example.com/data/{foo}")
     hashed = hash(template)
     assert hashed
+
+
+def test_template_can_be_expanded_repeatedly():
+    uri_template = URITemplate("/users/{user}{?page}")
+    assert uri_template.expand(user="alice", page=1) == "/users/alice?page=1"
+    assert uri_template.expand(user="bob") == "/users/bob"
+    assert uri_template.expand(user="alice", page=1) == "/users/alice?page=1"
+
+
+def test_prefix_of_undefined_variable_expands_to_nothing():
+    uri_template = URITemplate("X{var:3}Y{.var:3}")
+    assert uri_template.expand() == "XY"
+
+
+def test_unclosed_expressions_are_kept_as_literals():
+    uri_template = URITemplate("{var}{unclosed")
+    assert uri_template.expand(var="value") == "value{unclosed"
+
+
+def test_compiled_template_matches_interpreted_expansion():
+    uri_template = URITemplate("/users/{user}{/path*}{?q,page}{&list*}")
+    values = {"user": "Mulder & Scully", "path": ["a b", "c"], "q": "",
+              "page": 2, "list": ("x", "y")}
+    expected = "/users/Mulder%20%26%20Scully/a%20b/c?q=&page=2&list=x&list=y"
+    assert uri_template.compile()(**values) == expected
+    assert uri_template.compile() is uri_template.compile()
+
+
+def test_compiled_template_with_no_expressions():
+    assert URITemplate("/static/path").compile()() == "/static/path"
+    assert URITemplate("").compile()() == ""
+    assert URITemplate(None).compile()() is None
+
+
+def test_can_match_path_and_query():
+    uri_template = URITemplate("/users/{id}/posts{?page,sort}")
+    values = uri_template.match("/users/42/posts?page=2&sort=new")
+    assert values == {"id": "42", "page": "2", "sort": "new"}
+
+
+def test_can_match_uri_instance():
+    uri_template = URITemplate("http://example.com/{name}")
+    values = uri_template.match(URI("http://example.com/Hello%20World"))
+    assert values == {"name": "Hello World"}
+
+
+def test_can_match_exploded_variables():
+    uri_template = URITemplate("{/path*}{?keys*}")
+    values = uri_template.match("/a/b/c?x=1&y=2")
+    assert values == {"path": ["a", "b", "c"], "keys": {"x": "1", "y": "2"}}
+
+
+def test_can_match_reserved_and_fragment_expansions():
+    uri_template = URITemplate("{+base}/x{#frag}")
+    values = uri_template.match("http://example.com/y/x#sec?1")
+    assert values == {"base": "http://example.com/y", "frag": "sec?1"}
+
+
+def test_can_match_path_parameters():
+    uri_template = URITemplate("{;x,y,empty}")
+    values = uri_template.match(";x=1024;y=768;empty")
+    assert values == {"x": "1024", "y": "768", "empty": ""}
+
+
+def test_match_omits_undefined_variables():
+    uri_template = URITemplate("/search{?q,lang}")
+    assert uri_template.match("/search?q=cat") == {"q": "cat"}
+    assert uri_template.match("/search") == {}
+
+
+def test_match_fails_for_different_literals():
+    uri_template = URITemplate("/users/{id}")
+    assert uri_template.match("/groups/42") is None
+
+
+def test_match_fails_for_unknown_query_keys():
+    uri_template = URITemplate("/search{?q}")
+    assert uri_template.match("/search?q=1&z=2") is None
+
+
+def test_match_takes_unknown_keys_as_a_mapping():
+    uri_template = URITemplate("{?list*}")
+    assert uri_template.match("?list=a&list=b") == {"list": ["a", "b"]}
+    assert uri_template.match("?list=a&x=b") == \
+        {"list": {"list": "a", "x": "b"}}
+    assert uri_template.match("?x=b&list=a") == \
+        {"list": {"x": "b", "list": "a"}}
+    assert uri_template.match("?x=a&x=b") is None
+    assert URITemplate("{;v0*}").match(";v0=a;q=1") == \
+        {"v0": {"v0": "a", "q": "1"}}
+
+
+def test_match_fails_for_repeated_unexploded_keys():
+    uri_template = URITemplate("{?x,keys*}")
+    assert uri_template.match("?x=1&y=2") == {"x": "1", "keys": {"y": "2"}}
+    assert uri_template.match("?x=1&y=2&x=3") is None
+
+
+def test_match_fails_for_too_many_values():
+    uri_template = URITemplate("{x,y}")
+    assert uri_template.match("1,2,3") is None
+
+
+def test_matched_values_expand_to_original():
+    uri_template = URITemplate("{/list*,path:4}{?keys*}")
+    uri = "/red/green/blue/%2Ffoo?semi=%3B"
+    values = uri_template.match(uri)
+    assert uri_template.compile()(**values) == uri
+
+
+def test_match_takes_linear_time_over_adjacent_expressions():
+    from time import time
+    uri_template = URITemplate("{a}{b}{c}{d}x")
+    started = time()
+    assert uri_template.match("a" * 4000) is None
+    assert time() - started < 1.0
+    assert uri_template.match("a" * 4000 + "x") == {"a": "a" * 4000}
+
+
+def test_match_requires_variables_bound_by_partial():
+    uri_template = URITemplate("/a{#frag,x}").partial(x="X")
+    assert uri_template.match("/a#f,Z") is None
+    assert uri_template.match("/a") is None
+    assert uri_template.match("/a#f,X") == {"frag": "f"}
+    assert uri_template.match("/a#X") == {}
+
+
+def test_none_template_matches_nothing():
+    assert URITemplate(None).match("/") is None
+
+
+def test_router_returns_matching_template_and_values():
+    router = URITemplateRouter(["/users/{id}", "/users/{id}/posts{?page}"])
+    template, values = router.match("/users/7/posts?page=2")
+    assert template == URITemplate("/users/{id}/posts{?page}")
+    assert values == {"id": "7", "page": "2"}
+
+
+def test_router_prefers_literal_segments():
+    router = URITemplateRouter(["/users/{id}", "/users/me"])
+    template, values = router.match("/users/me")
+    assert template == URITemplate("/users/me")
+    assert values == {}
+    template, values = router.match("/users/7")
+    assert template == URITemplate("/users/{id}")
+    assert values == {"id": "7"}
+
+
+def test_router_files_templates_by_final_segment():
+    from time import time
+    router = URITemplateRouter(["/api/v1/resource%d{?page}" % i
+                                for i in range(1200)])
+    router.compile()
+    started = time()
+    for _ in range(100):
+        template, values = router.match("/api/v1/resource1199?page=2")
+    assert time() - started < 0.1
+    assert template == URITemplate("/api/v1/resource1199{?page}")
+    assert values == {"page": "2"}
+    assert router.match("/api/v1/resource1199/x") is None
+
+
+def test_router_falls_back_to_variable_segments():
+    router = URITemplateRouter(["/users/me/posts", "/{a}/{b}/posts"])
+    template, values = router.match("/users/7/posts")
+    assert template == URITemplate("/{a}/{b}/posts")
+    assert values == {"a": "users", "b": "7"}
+
+
+def test_router_tries_unfiled_templates():
+    router = URITemplateRouter(["/users/{id}", "{+anything}"])
+    template, values = router.match("/groups/1")
+    assert template == URITemplate("{+anything}")
+
+
+def test_router_returns_none_when_nothing_matches():
+    router = URITemplateRouter(["/users/{id}"])
+    router.compile()
+    assert router.match("/groups/1") is None
+
+
+def test_router_dispatches_hostile_paths_quickly():
+    from time import time
+    router = URITemplateRouter(["/users/{id}", "/files/{a}{b}{c}{d}.txt",
+                                "{+anything}x"])
+    started = time()
+    assert router.match("/files/" + "a" * 4000) is None
+    assert router.match("/" + "a/" * 4000) is None
+    assert time() - started < 1.0
+
+
+def test_router_matches_unknown_query_keys():
+    router = URITemplateRouter(["/items/{id}{?tags*}"])
+    template, values = router.match("/items/1?tags=a&other=1")
+    assert template == URITemplate("/items/{id}{?tags*}")
+    assert values == {"id": "1", "tags": {"tags": "a", "other": "1"}}
+
+
+def test_router_can_add_after_compiling():
+    router = URITemplateRouter().compile()
+    router.add("/users/{id}")
+    assert len(router) == 1
+    assert router.match(URI("/users/1"))[1] == {"id": "1"}
+
+
+def test_partial_expansion_leaves_other_variables_open():
+    uri_template = URITemplate("/api/{version}/users/{id}{?page}")
+    partial = uri_template.partial(version="v1")
+    assert partial == URITemplate("/api/v1/users/{id}{?page}")
+    assert partial.expand(id="42", page="2") == \
+        uri_template.expand(version="v1", id="42", page="2")
+
+
+def test_partial_expansion_splits_query_expressions():
+    uri_template = URITemplate("{?tenant,page,sort}")
+    assert uri_template.partial(tenant="acme") == \
+        URITemplate("?tenant=acme{&page,sort}")
+    assert uri_template.partial(tenant=None) == URITemplate("{?page,sort}")
+
+
+def test_partial_expansion_splits_path_segments():
+    uri_template = URITemplate("{/region,id}")
+    assert uri_template.partial(region="eu") == URITemplate("/eu{/id}")
+
+
+def test_partial_expansion_of_inseparable_expression():
+    uri_template = URITemplate("{x,y}")
+    partial = uri_template.partial(x="1024")
+    assert partial.compile()(y="768") == "1024,768"
+    assert partial.compile()() == "1024"
+    assert partial.expand(y="768") == URI("1024,768")
+    assert partial != uri_template
+    assert partial != uri_template.partial(x="1")
+    assert partial.partial(y="768") == URITemplate("1024,768")
+
+
+
+def test_can_expand_to_string():
+    uri_template = URITemplate("/users/{user}{?q}")
+    assert uri_template.expand_string(user="fred", q="a b") == \
+        "/users/fred?q=a%20b"
+
+
+def test_can_expand_to_bytes():
+    uri_template = URITemplate("/users/{user}")
+    assert uri_template.expand_bytes(user="Niño") == b"/users/Ni%C3%B1o"
+
+
+def test_expand_to_bytes_encodes_non_ascii_literals():
+    uri_template = URITemplate("/café/{x}")
+    assert uri_template.expand_bytes(x="1") == b"/caf%C3%A9/1"
+
+
+def test_none_template_expands_to_none_string_and_bytes():
+    uri_template = URITemplate(None)
+    assert uri_template.expand_string() is None
+    assert uri_template.expand_bytes() is None
+
+
+def test_can_expand_many_mappings():
+    uri_template = URITemplate("/users/{user}{?page}")
+    values = [{"user": "fred", "page": 1}, {"user": "a b"}, {}]
+    assert list(uri_template.expand_many(values)) == \
+        ["/users/fred?page=1", "/users/a%20b", "/users/"]
+
+
+def test_expand_many_encodes_repeated_values_once():
+    rendered = []
+
+    class Page(object):
+        def __str__(self):
+            rendered.append(self)
+            return "2"
+
+    uri_template = URITemplate("/users/{user}{?page}")
+    page = Page()
+    values = [{"user": "fred", "page": page}, {"user": "bob", "page": page}]
+    assert list(uri_template.expand_many(values)) == \
+        ["/users/fred?page=2", "/users/bob?page=2"]
+    assert rendered == [page]
+
+
+def test_expand_many_generates_its_function_once(monkeypatch):
+    generated = []
+    generate = URITemplate._generate
+
+    def spy(cls, program, memoise=False):
+        generated.append(memoise)
+        return generate(program, memoise)
+
+    monkeypatch.setattr(URITemplate, "_generate", classmethod(spy))
+    uri_template = URITemplate("/users/{user}")
+    for user in ("fred", "bob"):
+        assert list(uri_template.expand_many([{"user": user}])) == \
+            ["/users/" + user]
+    assert generated == [True]
+
+
+def test_expand_many_memos_are_bounded(monkeypatch):
+    from urimagic import rfc6570
+    monkeypatch.setattr(rfc6570, "_memo_size", 2)
+    rendered = []
+
+    class Page(object):
+        def __init__(self, number):
+            self.number = number
+
+        def __str__(self):
+            rendered.append(self.number)
+            return str(self.number)
+
+    uri_template = URITemplate("{?page}")
+    pages = [Page(1), Page(2), Page(3)]
+    values = [{"page": page} for page in pages + pages[:1]]
+    assert list(uri_template.expand_many(values)) == \
+        ["?page=1", "?page=2", "?page=3", "?page=1"]
+    assert rendered == [1, 2, 3, 1]
+
+
+def test_can_expand_columns():
+    uri_template = URITemplate("/users/{user}{?page,sort}{/list*}")
+    columns = {
+        "user": ["fred", "a b", "fred"],
+        "page": [1, 2, 3],
+        "list": [["x", "y"], None, ("z",)],
+    }
+    assert uri_template.expand_columns(columns) == [
+        "/users/fred?page=1/x/y",
+        "/users/a%20b?page=2",
+        "/users/fred?page=3/z",
+    ]
+
+
+def test_expand_columns_distinguishes_equal_values_of_different_types():
+    uri_template = URITemplate("{x}")
+    assert uri_template.expand_columns({"x": [1, True, 1.0]}) == \
+        ["1", "True", "1.0"]
+
+
+def test_expand_columns_requires_columns_of_same_length():
+    uri_template = URITemplate("{x}{y}")
+    try:
+        uri_template.expand_columns({"x": [1, 2], "y": [1]})
+    except ValueError:
+        assert True
+    else:
+        assert False
+
+
+def test_can_expand_columns_in_process_pool():
+    uri_template = URITemplate("{x,y}").partial(x="fixed")
+    columns = {"y": [str(i) for i in range(10)]}
+    assert uri_template.expand_columns(columns, processes=2) == \
+        uri_template.expand_columns(columns)
+
+
+def test_compiled_template_can_be_pickled():
+    uri_template = URITemplate("{x,y}").partial(x="1")
+    uri_template.compile()
+    copied = loads(dumps(uri_template))
+    assert copied == uri_template
+    assert copied.expand_string(y="2") == "1,2"
+
+
+def test_can_expand_product():
+    uri_template = URITemplate("/{year}/{month}{?page}")
+    expansions = uri_template.expand_product(
+        year=[2013, 2014], month=["01", "02"], page=[1, None])
+    assert len(expansions) == 8
+    assert list(expansions) == [
+        "/2013/01?page=1", "/2013/01", "/2013/02?page=1", "/2013/02",
+        "/2014/01?page=1", "/2014/01", "/2014/02?page=1", "/2014/02",
+    ]
+
+
+def test_can_index_and_slice_product():
+    uri_template = URITemplate("{x,y}")
+    expansions = uri_template.expand_product(x=range(3), y=["a", "b c"])
+    assert expansions[3] == "1,b%20c"
+    assert expansions[-1] == "2,b%20c"
+    assert list(expansions[2:5]) == ["1,a", "1,b%20c", "2,a"]
+    assert list(expansions[::2]) == ["0,a", "1,a", "2,a"]
+
+
+def test_product_follows_template_order_not_argument_order():
+    uri_template = URITemplate("{x,y}")
+    expansions = uri_template.expand_product(y=["a", "b"], x=[1, 2])
+    assert list(expansions) == ["1,a", "1,b", "2,a", "2,b"]
+
+
+def test_product_index_out_of_range():
+    expansions = URITemplate("{x}").expand_product(x=[1])
+    try:
+        _ = expansions[1]
+    except IndexError:
+        assert True
+    else:
+        assert False
+
+
+def test_product_leaves_other_variables_undefined():
+    uri_template = URITemplate("{/x,y}")
+    assert list(uri_template.expand_product(y=["a", "b"])) == ["/a", "/b"]
+
+
+def test_encoded_values_are_not_encoded_again():
+    uri_template = URITemplate("/files/{name}{?token}")
+    values = {"name": Encoded("a%2Fb"), "token": Encoded("x%3D%3D")}
+    assert uri_template.expand_string(**values) == "/files/a%2Fb?token=x%3D%3D"
+    assert uri_template.expand(**values) == \
+        URITemplate("/files/{name}{?token}").expand(name="a/b", token="x==")
+
+
+def test_encoded_values_may_use_reserved_characters_in_reserved_expansion():
+    uri_template = URITemplate("{+path}")
+    assert uri_template.expand_string(path=Encoded("/a/b%20c")) == "/a/b%20c"
+
+
+def test_encoded_values_with_illegal_characters_are_rejected():
+    uri_template = URITemplate("/files/{name}")
+    try:
+        uri_template.expand_string(name=Encoded("a/b"))
+    except ValueError:
+        assert True
+    else:
+        assert False
+
+
+def test_prefix_of_encoded_value_keeps_escapes_whole():
+    uri_template = URITemplate("{x:3}")
+    assert uri_template.expand_string(x=Encoded("%2F%2Fabc")) == "%2F%2Fa"
+
+
+def test_expansions_are_not_cached_by_default():
+    assert URITemplate("{x}").cache is None
+
+
+def test_can_cache_expansions():
+    uri_template = URITemplate("/users/{user}{?tags}").use_cache(10)
+    assert uri_template.expand_string(user="fred", tags=["a", "b"]) == \
+        "/users/fred?tags=a,b"
+    assert uri_template.expand_string(user="fred", tags=("a", "b")) == \
+        "/users/fred?tags=a,b"
+    assert uri_template.expand(user="fred", tags=["a", "b"]) == \
+        URI("/users/fred?tags=a,b")
+    assert uri_template.cache.misses == 1
+    assert uri_template.cache.hits == 2
+
+
+def test_cache_keys_ignore_unused_values():
+    uri_template = URITemplate("{x}").use_cache()
+    uri_template.expand_string(x="1", y="2")
+    uri_template.expand_string(x="1", y="3")
+    assert uri_template.cache.hits == 1
+
+
+def test_cache_keys_distinguish_types_and_item_order():
+    uri_template = URITemplate("{x}{?keys*}").use_cache()
+    assert uri_template.expand_string(x=1) == "1"
+    assert uri_template.expand_string(x=True) == "True"
+    assert uri_template.expand_string(x=Encoded("a%20b")) == "a%20b"
+    assert uri_template.expand_string(x="a%20b") == "a%2520b"
+    keys = OrderedDict([("a", "1"), ("b", "2")])
+    assert uri_template.expand_string(keys=keys) == "?a=1&b=2"
+    keys = OrderedDict([("b", "2"), ("a", "1")])
+    assert uri_template.expand_string(keys=keys) == "?b=2&a=1"
+    assert uri_template.cache.hits == 0
+
+
+def test_unhashable_values_bypass_cache():
+    uri_template = URITemplate("{x}").use_cache()
+    assert uri_template.expand_string(x=bytearray(b"abc")) == "abc"
+    assert len(uri_template.cache) == 0
+
+
+def test_cache_is_bounded_and_can_be_disabled():
+    uri_template = URITemplate("{x}").use_cache(2)
+    for x in range(5):
+        uri_template.expand_string(x=x)
+    assert len(uri_template.cache) == 2
+    assert uri_template.cache.evictions == 3
+    assert uri_template.use_cache(None).cache is None
+
+
+def test_get_returns_shared_compiled_templates():
+    URITemplate.template_cache.clear()
+    first = URITemplate.get("/users/{user}")
+    second = URITemplate.get("/users/{user}")
+    assert first is second
+    assert first.expand_string(user="fred") == "/users/fred"
+    assert URITemplate.template_cache.misses == 1
+    assert URITemplate.template_cache.hits == 1
+
+
+def test_get_passes_through_templates_and_none():
+    uri_template = URITemplate("{x}")
+    assert URITemplate.get(uri_template) is uri_template
+    assert URITemplate.get(None) == URITemplate(None)
+
+
+def test_can_prewarm_template_cache():
+    URITemplate.template_cache.clear()
+    templates = URITemplate.prewarm(["/a/{x}", "/b/{y}"])
+    assert templates == [URITemplate("/a/{x}"), URITemplate("/b/{y}")]
+    assert "/a/{x}" in URITemplate.template_cache
+    assert URITemplate.get("/b/{y}") is templates[1]
+    URITemplate.template_cache.clear()
+
+
+def test_can_expand_generators_and_other_iterables():
+    uri_template = URITemplate("/items{?ids*,tags}")
+    values = {"ids": (str(i) for i in range(3)), "tags": iter(["a", "b"])}
+    assert uri_template.expand_string(**values) == \
+        "/items?ids=0&ids=1&ids=2&tags=a,b"
+
+
+def test_uris_expand_as_strings_rather_than_lists():
+    uri_template = URITemplate("{+base}/x")
+    base = URI("http://example.com/a")
+    assert uri_template.expand_string(base=base) == "http://example.com/a/x"
+    assert uri_template.expand(base=base) == "http://example.com/a/x"
+
+
+def test_can_expand_any_mapping():
+    uri_template = URITemplate("{?keys*}")
+    keys = MappingProxyType(OrderedDict([("a", "1"), ("b", "2")]))
+    assert uri_template.expand_string(keys=keys) == "?a=1&b=2"
+
+
+def test_can_expand_to_stream():
+    uri_template = URITemplate("/items{?ids*}{#frag}")
+    stream = StringIO()
+    uri_template.expand_to(stream, ids=(str(i) for i in range(3)), frag="x")
+    assert stream.getvalue() == "/items?ids=0&ids=1&ids=2#x"
+
+
+def test_expansion_to_stream_matches_string_expansion():
+    uri_template = URITemplate("X{.list*}{/keys*}{;x,empty,undef}{&list}")
+    values = {
+        "list": ("red", "green"),
+        "keys": OrderedDict([("semi", ";"), ("dot", ".")]),
+        "x": "1024",
+        "empty": "",
+        "undef": None,
+    }
+    stream = StringIO()
+    uri_template.expand_to(stream, **values)
+    assert stream.getvalue() == uri_template.expand_string(**values)
+
+
+def test_iterators_bypass_expansion_cache():
+    uri_template = URITemplate("{list}").use_cache()
+    assert uri_template.expand_string(list=iter(["a", "b"])) == "a,b"
+    assert uri_template.expand_string(list=iter(["c"])) == "c"
+    assert len(uri_template.cache) == 0
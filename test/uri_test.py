@@ -700,3 +700,214 @@ def test_can_build_uri_from_scheme_port_and_path():
     assert uri.port == 3456
     assert uri.host_port == ":3456"
     assert uri.absolute_path_reference == "/foo"
+
+
+def test_fragment_starts_at_first_hash_even_after_question_mark():
+    uri = URI("http://example.com/a?b#c?d#e")
+    assert uri.path == "/a"
+    assert uri.query == "b"
+    assert uri.fragment == "c?d#e"
+
+
+def test_question_mark_within_fragment_does_not_start_query():
+    uri = URI("http://example.com/a#b?c")
+    assert uri.query is None
+    assert uri.fragment == "b?c"
+
+
+def test_user_info_ends_at_last_at_sign():
+    uri = URI("http://bob@home@example.com:8080/")
+    assert uri.user_info == "bob@home"
+    assert uri.host == "example.com"
+    assert uri.port == 8080
+
+
+def test_non_numeric_port_is_rejected():
+    try:
+        URI("http://example.com:http/")
+    except ValueError:
+        assert True
+    else:
+        assert False
+
+
+def test_components_are_built_on_first_access():
+    uri = URI("http://example.com/foo?bad=%C3")
+    assert uri.host == "example.com"
+    assert uri.path == "/foo"
+    query = uri.query
+    assert query.string == "bad=%C3"
+    try:
+        _ = query.get("bad")
+    except UnicodeDecodeError:
+        assert True
+    else:
+        assert False
+
+
+def test_can_copy_unmaterialised_uri():
+    uri = URI(URI("http://bob@example.com:8080/foo?bar=baz#qux"))
+    assert uri.string == "http://bob@example.com:8080/foo?bar=baz#qux"
+    assert uri.user_info == "bob"
+    assert uri.port == 8080
+
+
+def test_unknown_attributes_are_still_missing():
+    uri = URI("http://example.com/")
+    assert not hasattr(uri, "nonsense")
+
+
+def test_string_is_cached():
+    uri = URI("http://example.com/foo%20bar")
+    assert uri.string is uri.string
+    assert uri.path.string is uri.path.string
+
+
+def test_building_from_a_uri_does_not_alter_the_original():
+    base = URI("http://bob@example.com:8080/foo")
+    assert base.string == "http://bob@example.com:8080/foo"
+    built = URI.build(string=base, user_info="alice", host="example.org",
+                      port=9090, path="/bar")
+    assert built.string == "http://alice@example.org:9090/bar"
+    assert base.string == "http://bob@example.com:8080/foo"
+    assert base.authority.string == "bob@example.com:8080"
+    assert hash(built) == hash("http://alice@example.org:9090/bar")
+
+
+def test_building_with_host_port_replaces_cached_string():
+    base = URI("http://example.com:8080/foo")
+    assert base.string == "http://example.com:8080/foo"
+    built = URI.build(string=base, host_port="example.org:9090")
+    assert built.string == "http://example.org:9090/foo"
+    assert base.string == "http://example.com:8080/foo"
+
+
+def test_parse_without_cache_returns_new_instances():
+    assert URI.parse("http://example.com/") is not URI.parse("http://example.com/")
+
+
+def test_parse_with_cache_returns_shared_instances():
+    URI.parse_cache.clear()
+    first = URI.parse("http://example.com/cached", cache=True)
+    second = URI.parse("http://example.com/cached", cache=True)
+    assert first is second
+    assert URI.parse_cache.misses == 1
+    assert URI.parse_cache.hits == 1
+
+
+def test_parse_cache_evicts_least_recently_used():
+    URI.parse_cache.clear()
+    max_size = URI.parse_cache.max_size
+    URI.parse_cache.max_size = 2
+    try:
+        a = URI.parse("/a", cache=True)
+        URI.parse("/b", cache=True)
+        assert URI.parse("/a", cache=True) is a
+        URI.parse("/c", cache=True)
+        assert URI.parse_cache.evictions == 1
+        assert "/a" in URI.parse_cache
+        assert "/b" not in URI.parse_cache
+    finally:
+        URI.parse_cache.max_size = max_size
+        URI.parse_cache.clear()
+
+
+def test_cached_uri_cannot_be_modified():
+    uri = URI.parse("http://bob@example.com:8080/foo?bar=baz#qux", cache=True)
+    try:
+        uri.host = "example.org"
+    except AttributeError:
+        assert True
+    else:
+        assert False
+    URI.build(string=uri, host="example.org", query="spam=eggs")
+    uri.resolve("../other?x=y")
+    assert uri.string == "http://bob@example.com:8080/foo?bar=baz#qux"
+    assert URI.parse(uri.string, cache=True) is uri
+
+
+def test_uri_has_no_instance_dict():
+    uri = URI("http://bob@example.com:8080/foo?bar=baz#qux")
+    uri.string
+    for part in (uri, uri.authority, uri.path, uri.query):
+        assert not hasattr(part, "__dict__")
+
+
+def test_can_pickle_unread_and_read_uris():
+    import pickle
+    unread = URI("http://bob@example.com:8080/foo%20bar?baz=qux#frag")
+    restored = pickle.loads(pickle.dumps(unread))
+    assert restored.string == "http://bob@example.com:8080/foo%20bar?baz=qux#frag"
+    read = URI("http://example.com/foo")
+    assert read.host == "example.com"
+    restored = pickle.loads(pickle.dumps(read))
+    assert restored.string == "http://example.com/foo"
+
+
+def test_can_pickle_uris_with_every_protocol():
+    import pickle
+    uri = URI("http://bob@example.com:8080/foo%20bar?baz=qux#frag")
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+        restored = pickle.loads(pickle.dumps(uri, protocol))
+        assert restored == uri
+        assert restored.query.get("baz") == "qux"
+
+
+def test_uris_can_be_weakly_referenced():
+    from weakref import WeakValueDictionary
+    uri = URI("http://example.com/foo")
+    cache = WeakValueDictionary()
+    cache[uri.string] = uri
+    assert cache["http://example.com/foo"] is uri
+    for part in (uri.authority, uri.path):
+        cache[part.string] = part
+        assert cache[part.string] is part
+
+
+def test_source_is_matched_once_for_all_components():
+    parser = URI._parser
+    matched = []
+
+    class CountingParser(object):
+        def match(self, string):
+            matched.append(string)
+            return parser.match(string)
+
+    URI._parser = CountingParser()
+    try:
+        uri = URI("http://bob@example.com:8080/foo?bar=baz#qux")
+        assert uri.string == "http://bob@example.com:8080/foo?bar=baz#qux"
+        assert uri.host == "example.com"
+    finally:
+        URI._parser = parser
+    assert len(matched) == 1
+
+
+def test_port_is_found_as_the_parser_finds_it():
+    for string in ["http://h:80/", "http://a:b@h:80?q", "http://a@b:c@h",
+                   "//h:80", "s://a@b:1@c:2#f", "http://[::1]:8080/"]:
+        match = URI._parser.match(string)
+        port = URI._port_parser.match(string)
+        assert (port and port.group(1)) == match.group(5)
+
+
+
+def test_bad_port_is_reported_by_constructor():
+    try:
+        URI("http://h:x/")
+    except ValueError:
+        pass
+    else:
+        assert False, "bad port accepted"
+
+
+def test_building_with_invalid_query_text_encodes_it():
+    uri = URI.build(scheme="http", host="h", path="/p", query="a b&c=d#e")
+    assert uri.string == "http://h/p?a%20b&c=d%23e"
+    assert URI("?0 é2").string == "?0%20%C3%A92"
+
+
+def test_uri_equality_ignores_spelling_of_query_escapes():
+    assert URI("http://h/?a=%7e") == URI("http://h/?a=~")
+    assert hash(URI("http://h/?a=%7e")) == hash(URI("http://h/?a=~"))
+    assert URI("http://h/?a=%7e").string == "http://h/?a=%7e"
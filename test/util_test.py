@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2014, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import unicode_literals
+
+from urimagic import util
+
+
+def test_lru_cache_works_without_ordered_dict(monkeypatch):
+    monkeypatch.setattr(util, "OrderedDict", util._OrderedEntries)
+    cache = util.LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    cache.max_size = 1
+    assert "c" not in cache
+    assert cache.get("a") == 1
+    cache.clear()
+    assert len(cache) == 0
+    cache.put("d", 4)
+    assert cache.get("d") == 4
@@ -34,3 +34,4 @@ __version__ = "1.1.0"
 
 from .rfc3986 import *
 from .rfc6570 import *
+from .codec import *
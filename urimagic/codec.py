@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright 2013-2014, Nigel Small
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+A Python codec for percent-encoded text, registered as "uri-percent".
+
+Decoding follows `percent_decode` (including '+' as space) and encoding
+follows `percent_encode` with no safe characters. The incremental decoder
+can be fed data in arbitrary chunks, even where a chunk boundary falls in
+the middle of a `%XX` escape or a multibyte UTF-8 character:
+
+    >>> import codecs
+    >>> "".join(codecs.iterdecode([b"El%20Ni%C", b"3%B1o"], "uri-percent"))
+    'El Niño'
+
+"""
+
+
+from __future__ import unicode_literals
+
+import codecs
+
+from .rfc3986 import percent_decode_bytes, percent_encode_bytes
+from .util import view_types
+
+
+__all__ = ["PercentIncrementalEncoder", "PercentIncrementalDecoder"]
+
+
+NAME = "uri-percent"
+
+
+def _octets(data):
+    # Python 2 turns a memoryview into its repr rather than its contents.
+    if isinstance(data, view_types):
+        return data.tobytes()
+    return bytes(data)
+
+
+def percent_codec_encode(input, errors="strict"):
+    encoded = percent_encode_bytes(input.encode("utf-8", errors))
+    return bytes(encoded), len(input)
+
+
+def percent_codec_decode(input, errors="strict"):
+    decoded = percent_decode_bytes(_octets(input)).decode("utf-8", errors)
+    return decoded, len(input)
+
+
+class PercentIncrementalEncoder(codecs.IncrementalEncoder):
+    """ Incremental encoder for the "uri-percent" codec.
+    """
+
+    def encode(self, input, final=False):
+        return percent_codec_encode(input, self.errors)[0]
+
+
+class PercentIncrementalDecoder(codecs.IncrementalDecoder):
+    """ Incremental decoder for the "uri-percent" codec. Trailing data that
+    might form part of a `%XX` escape is held back until the next chunk
+    arrives, as are the leading octets of any incomplete UTF-8 character.
+    """
+
+    def __init__(self, errors="strict"):
+        codecs.IncrementalDecoder.__init__(self, errors)
+        self.__pending = b""
+        self.__utf8 = codecs.getincrementaldecoder("utf-8")(errors)
+
+    def decode(self, input, final=False):
+        data = self.__pending + _octets(input) if self.__pending else input
+        self.__pending = b""
+        if not final:
+            tail = _octets(data[-2:])
+            cut = tail.rfind(b"%")
+            if cut >= 0:
+                cut += len(data) - len(tail)
+                data, self.__pending = data[:cut], _octets(data[cut:])
+        return self.__utf8.decode(percent_decode_bytes(data), final)
+
+    def reset(self):
+        self.__pending = b""
+        self.__utf8.reset()
+
+    def getstate(self):
+        # Any buffered UTF-8 octets are re-encoded so that the whole state
+        # can be expressed as undecoded input.
+        octets = self.__utf8.getstate()[0]
+        return bytes(percent_encode_bytes(octets)) + self.__pending, 0
+
+    def setstate(self, state):
+        self.reset()
+        self.decode(state[0])
+
+
+def _search(name):
+    if name.replace("_", "-") == NAME:
+        return codecs.CodecInfo(
+            name=NAME,
+            encode=percent_codec_encode,
+            decode=percent_codec_decode,
+            incrementalencoder=PercentIncrementalEncoder,
+            incrementaldecoder=PercentIncrementalDecoder,
+        )
+    return None
+
+
+codecs.register(_search)
@@ -20,6 +20,52 @@ try:
     from collections.abc import Mapping
 except ImportError:
     from collections import Mapping
+try:
+    from itertools import izip as zip
+except ImportError:
+    pass  # Python 3: zip is already lazy
+try:
+    from sys import intern
+except ImportError:
+    pass  # Python 2: intern is a builtin
+
+
+def _unique_keys(pairs):
+    # Yield each distinct key from a sequence of pairs, in order of first
+    # appearance, falling back to equality search for unhashable keys.
+    seen, unhashable = set(), []
+    for k, v in pairs:
+        try:
+            if k in seen:
+                continue
+            seen.add(k)
+        except TypeError:
+            if k in unhashable:
+                continue
+            unhashable.append(k)
+        yield k
+
+
+def _collect(pairs):
+    # Group the values in a sequence of pairs by key, returning a list of
+    # (key, values) pairs in order of each key's first appearance.
+    groups, lookup, unhashable = [], {}, []
+    for k, v in pairs:
+        try:
+            values = lookup.get(k)
+            if values is None:
+                values = lookup[k] = []
+                groups.append((k, values))
+        except TypeError:
+            for key, values in unhashable:
+                if key == k:
+                    break
+            else:
+                values = []
+                unhashable.append((k, values))
+                groups.append((k, values))
+        values.append(v)
+    return groups
 
 
 class KeyValueList(list):
@@ -44,8 +90,17 @@ class KeyValueList(list):
      3     | 'b' | [8, 9]
      4     | 'c' | 'b'
 
+    Lookups by key are served from an index of key positions, which is
+    built on first use and kept up to date as items are appended. Other
+    modifications discard the index until it is next needed. Lists with
+    unhashable keys are searched linearly instead.
+
     """
 
+    # Key -> ascending list of positions, None if not yet built, or False
+    # if the keys cannot be indexed.
+    __index = None
+
     def __init__(self, iterable=(), **kwargs):
         list.__init__(self)
         self.extend(iterable)
@@ -54,6 +109,11 @@ class KeyValueList(list):
     def __repr__(self):
         return "{0}({1})".format(self.__class__.__name__, list.__repr__(self))
 
+    def __reduce__(self):
+        # Rebuild from the pairs, as the unpickler would otherwise add them
+        # through an `append` that takes a single argument.
+        return self.__class__, (list(self),)
+
     def __getitem__(self, index):
         """ Get a single item.
 
@@ -105,6 +165,7 @@ class KeyValueList(list):
         IndexError: list assignment index out of range
 
         """
+        self.__discard_index()
         list.__setitem__(self, index, item)
 
     def __setslice__(self, start, stop, items):
@@ -122,6 +183,7 @@ class KeyValueList(list):
         ('blue', 'sky')
 
         """
+        self.__discard_index()
         list.__setslice__(self, start, stop, items)
 
     def __delitem__(self, index):
@@ -141,6 +203,7 @@ class KeyValueList(list):
         IndexError: list assignment index out of range
 
         """
+        self.__discard_index()
         list.__delitem__(self, index)
 
     def __delslice__(self, start, end):
@@ -155,6 +218,7 @@ class KeyValueList(list):
         ('blue', 'sky')
 
         """
+        self.__discard_index()
         list.__delslice__(self, start, end)
 
     def __contains__(self, item):
@@ -192,6 +256,40 @@ class KeyValueList(list):
         """
         return list.__iter__(self)
 
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, n):
+        self.__discard_index()
+        return list.__imul__(self, n)
+
+    def __discard_index(self):
+        # Only an instance holding an index needs its own attribute; writing
+        # one otherwise would give every list a `__dict__`.
+        if self.__index is not None:
+            self.__index = None
+
+    def __positions(self, key):
+        """ Return the positions at which a key occurs, in ascending order,
+        or None if the keys in this list cannot be indexed.
+        """
+        index = self.__index
+        if index is None:
+            index = {}
+            try:
+                for i, (k, v) in enumerate(list.__iter__(self)):
+                    index.setdefault(k, []).append(i)
+            except TypeError:
+                index = False
+            self.__index = index
+        if index is False:
+            return None
+        try:
+            return index.get(key, ())
+        except TypeError:
+            return None
+
     def append(self, key, value):
         """ Append a single key-value pair to the end of this list.
 
@@ -206,6 +304,15 @@ class KeyValueList(list):
         ('three', 'drei')
 
         """
+        index = self.__index
+        if index:
+            try:
+                index.setdefault(key, []).append(len(self))
+            except TypeError:
+                self.__index = False
+        elif index is not None:
+            # An empty or unusable index is simply rebuilt when needed.
+            self.__index = None
         list.append(self, (key, value))
 
     def extend(self, iterable):
@@ -227,6 +334,7 @@ class KeyValueList(list):
         ValueError: KeyValueList items must be pairs
 
         """
+        self.__discard_index()
         if isinstance(iterable, Mapping):
             list.extend(self, iterable.items())
         else:
@@ -248,6 +356,7 @@ class KeyValueList(list):
         ('three', 'drei')
 
         """
+        self.__discard_index()
         list.insert(self, index, (key, value))
 
     def has_item(self, key, value):
@@ -262,6 +371,10 @@ class KeyValueList(list):
         False
 
         """
+        positions = self.__positions(key)
+        if positions is not None:
+            get = list.__getitem__
+            return any(get(self, i)[1] == value for i in positions)
         for k, v in self:
             if k == key and v == value:
                 return True
@@ -278,6 +391,9 @@ class KeyValueList(list):
         False
 
         """
+        positions = self.__positions(key)
+        if positions is not None:
+            return bool(positions)
         for k, v in self:
             if k == key:
                 return True
@@ -313,6 +429,10 @@ class KeyValueList(list):
         ...     print(value)
 
         """
+        positions = self.__positions(key)
+        if positions is not None:
+            get = list.__getitem__
+            return iter([get(self, i)[1] for i in positions])
         return (v for k, v in self if k == key)
 
     def put(self, key, *values):
@@ -331,13 +451,25 @@ class KeyValueList(list):
         KeyValueList([('red', 'heart'), ('blue', 'jeans'), ('red', 'berry')])
 
         """
-        new_values = list(values)
-        self[:] = [
-            (k, value) if k != key else (k, new_values.pop(0))
-            for k, value in self
-            if k != key or new_values
-        ]
-        self.extend([(key, value) for value in new_values])
+        positions = self.__positions(key) if self.__index else None
+        if positions is not None and len(positions) <= len(values):
+            # Existing items can be replaced in place, leaving the index
+            # intact, with any extra values appended.
+            for i, position in enumerate(positions):
+                list.__setitem__(self, position, (
+                    list.__getitem__(self, position)[0], values[i]))
+            for value in values[len(positions):]:
+                self.append(key, value)
+            return
+        items, count = [], 0
+        for k, v in self:
+            if k != key:
+                items.append((k, v))
+            elif count < len(values):
+                items.append((k, values[count]))
+                count += 1
+        self[:] = items
+        self.extend([(key, value) for value in values[count:]])
 
     def remove(self, key):
         """ Remove all items from this list that contain the key specified. If
@@ -354,6 +486,8 @@ class KeyValueList(list):
         ValueError: Key 'yellow' not in list
 
         """
+        if not self.has_key(key):
+            raise ValueError("Key {0} not in list".format(repr(key)))
         length = len(self)
         self[:] = ((k, v) for k, v in self if k != key)
         if len(self) == length:
@@ -376,9 +510,18 @@ class KeyValueList(list):
         IndexError: pop index out of range
 
         """
-        if index is None:
-            return list.pop(self)
+        if index is None or index in (-1, len(self) - 1):
+            item = list.pop(self)
+            if self.__index:
+                positions = self.__index[item[0]]
+                positions.pop()
+                if not positions:
+                    del self.__index[item[0]]
+            else:
+                self.__discard_index()
+            return item
         else:
+            self.__discard_index()
             return list.pop(self, index)
 
     def clear(self):
@@ -415,6 +558,7 @@ class KeyValueList(list):
         ('red', 'rose')
 
         """
+        self.__discard_index()
         list.sort(self, *args, **kwargs)
 
     def reverse(self):
@@ -437,6 +581,7 @@ class KeyValueList(list):
         ('red', 'rose')
 
         """
+        self.__discard_index()
         list.reverse(self)
 
     def copy(self):
@@ -475,11 +620,8 @@ class KeyValueList(list):
 
         """
         if collect:
-            keys = []
-            for k, v in self:
-                if k not in keys:
-                    keys.append(k)
-                    yield k
+            for k in _unique_keys(self):
+                yield k
         else:
             for k, v in self:
                 yield k
@@ -504,17 +646,8 @@ class KeyValueList(list):
 
         """
         if collect:
-            keys, values = [], []
-            for k, v in self:
-                try:
-                    index = keys.index(k)
-                except ValueError:
-                    keys.append(k)
-                    values.append([v])
-                else:
-                    values[index].append((v))
-            for value in values:
-                yield value
+            for k, values in _collect(self):
+                yield values
         else:
             for k, v in self:
                 yield v
@@ -540,17 +673,210 @@ class KeyValueList(list):
 
         """
         if collect:
-            keys, items = [], []
-            for k, v in self:
-                try:
-                    index = keys.index(k)
-                except ValueError:
-                    keys.append(k)
-                    items.append((k, [v]))
-                else:
-                    items[index][1].append((v))
-            for item in items:
+            for item in _collect(self):
                 yield item
         else:
             for item in self:
                 yield item
+
+
+class CompactKeyValueList(object):
+    """ A CompactKeyValueList offers the same interface as a
+    :py:class:`KeyValueList` but stores its keys and values in two parallel
+    lists instead of one list of pairs, so no tuple is kept for each item.
+    Pairs are only created as they are requested. Native string keys are
+    interned, so that keys repeated across many lists are stored only once
+    (on Python 2, where only byte strings can be interned, text keys are
+    kept as they are).
+
+    >>> kvl = CompactKeyValueList([('a', 1), ('c', 7)], b=[8, 9])
+    >>> kvl
+    CompactKeyValueList([('a', 1), ('c', 7), ('b', [8, 9])])
+    >>> kvl[1]
+    ('c', 7)
+
+    Keyed lookups scan the list of keys, which is done at C speed but does
+    not benefit from the index kept by a :py:class:`KeyValueList`.
+
+    """
+
+    __slots__ = ("__keys", "__values")
+
+    def __init__(self, iterable=(), **kwargs):
+        self.__keys = []
+        self.__values = []
+        self.extend(iterable)
+        self.extend(kwargs)
+
+    @staticmethod
+    def __intern(key):
+        return intern(key) if type(key) is str else key
+
+    def __repr__(self):
+        return "{0}({1})".format(self.__class__.__name__, list(self))
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def __bool__(self):
+        return bool(self.__keys)
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        try:
+            other = list(other)
+        except TypeError:
+            return NotImplemented
+        return list(self) == other
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return self.__keys, self.__values
+
+    def __setstate__(self, state):
+        self.__keys, self.__values = state
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            out = CompactKeyValueList()
+            out.__keys = self.__keys[index]
+            out.__values = self.__values[index]
+            return out
+        return self.__keys[index], self.__values[index]
+
+    def __getslice__(self, start, end):
+        return self.__getitem__(slice(start, end))
+
+    def __setitem__(self, index, item):
+        if isinstance(index, slice):
+            items = [(self.__intern(k), v) for k, v in item]
+            self.__keys[index] = [k for k, v in items]
+            self.__values[index] = [v for k, v in items]
+        else:
+            key, value = item
+            self.__keys[index] = self.__intern(key)
+            self.__values[index] = value
+
+    def __setslice__(self, start, stop, items):
+        self.__setitem__(slice(start, stop), items)
+
+    def __delitem__(self, index):
+        del self.__keys[index]
+        del self.__values[index]
+
+    def __delslice__(self, start, end):
+        self.__delitem__(slice(start, end))
+
+    def __contains__(self, item):
+        key, value = item
+        return self.has_item(key, value)
+
+    def __iter__(self):
+        return zip(self.__keys, self.__values)
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __positions(self, key):
+        keys, i = self.__keys, -1
+        while True:
+            try:
+                i = keys.index(key, i + 1)
+            except ValueError:
+                return
+            yield i
+
+    def append(self, key, value):
+        self.__keys.append(self.__intern(key))
+        self.__values.append(value)
+
+    def extend(self, iterable):
+        if isinstance(iterable, Mapping):
+            iterable = iterable.items()
+        for item in iterable:
+            try:
+                key, value = item
+            except ValueError:
+                raise ValueError("KeyValueList items must be pairs")
+            self.append(key, value)
+
+    def insert(self, index, key, value):
+        self.__keys.insert(index, self.__intern(key))
+        self.__values.insert(index, value)
+
+    def has_item(self, key, value):
+        values = self.__values
+        return any(values[i] == value for i in self.__positions(key))
+
+    def has_key(self, key):
+        return key in self.__keys
+
+    def has_value(self, value):
+        return value in self.__values
+
+    def get(self, key):
+        values = self.__values
+        return iter([values[i] for i in self.__positions(key)])
+
+    def put(self, key, *values):
+        positions = list(self.__positions(key))
+        for position, value in zip(positions, values):
+            self.__values[position] = value
+        if len(positions) > len(values):
+            self.__drop(set(positions[len(values):]))
+        for value in values[len(positions):]:
+            self.append(key, value)
+
+    def remove(self, key):
+        positions = set(self.__positions(key))
+        if not positions:
+            raise ValueError("Key {0} not in list".format(repr(key)))
+        self.__drop(positions)
+
+    def __drop(self, positions):
+        kept = [i for i in range(len(self.__keys)) if i not in positions]
+        self.__keys[:] = [self.__keys[i] for i in kept]
+        self.__values[:] = [self.__values[i] for i in kept]
+
+    def pop(self, index=None):
+        if index is None:
+            index = -1
+        return self.__keys.pop(index), self.__values.pop(index)
+
+    def clear(self):
+        del self.__keys[:]
+        del self.__values[:]
+
+    def sort(self, *args, **kwargs):
+        items = list(self)
+        items.sort(*args, **kwargs)
+        self[:] = items
+
+    def reverse(self):
+        self.__keys.reverse()
+        self.__values.reverse()
+
+    def copy(self):
+        return self[:]
+
+    def iterkeys(self, collect=False):
+        if collect:
+            return _unique_keys(self)
+        return iter(self.__keys)
+
+    def itervalues(self, collect=False):
+        if collect:
+            return (values for k, values in _collect(self))
+        return iter(self.__values)
+
+    def iteritems(self, collect=False):
+        if collect:
+            return iter(_collect(self))
+        return iter(self)
@@ -26,13 +26,15 @@ See: http://www.ietf.org/rfc/rfc3986.txt
 from __future__ import unicode_literals
 
 import re
+from array import array
 
 from .kvlist import KeyValueList
-from .util import ustr
+from .util import LRUCache, text_type, ustr, view_types
 
 
 __all__ = ["general_delimiters", "subcomponent_delimiters",
            "reserved", "unreserved", "percent_encode", "percent_decode",
+           "percent_encode_bytes", "percent_decode_bytes", "Encoded",
            "ParameterString", "Authority", "Path", "Query", "URI"]
 
 
@@ -47,35 +49,176 @@ unreserved = ("ABCDEFGHIJKLMNOPQRSTUVWXYZ"
               "0123456789-._~")
 
 
+# Per-`safe` encoding tables, built on first use and shared thereafter.
+_encoding_tables = {}
+
+
+def _encoding_table(safe):
+    """ Fetch the (pattern, octet_pattern, escapes, text_escapes, wide)
+    tuple used to percent encode data with a particular set of safe
+    characters. The patterns match any character or octet that needs
+    escaping and the escapes lists map each of the 256 possible octet values
+    onto its encoded form, as bytes and as text respectively. The flag
+    `wide` is true if any safe character lies outside ASCII.
+    """
+    try:
+        return _encoding_tables[safe]
+    except KeyError:
+        kept = "".join(sorted(set(unreserved + safe) - set("%")))
+        pattern = re.compile("[^" + re.escape(kept) + "]")
+        kept_octets = "".join(char for char in kept if ord(char) < 0x80)
+        octet_pattern = re.compile(
+            ("[^" + re.escape(kept_octets) + "]").encode("ascii"))
+        text_escapes = ["%{0:02X}".format(b) for b in range(256)]
+        for char in kept_octets:
+            text_escapes[ord(char)] = char
+        escapes = [escape.encode("ascii") for escape in text_escapes]
+        wide = any(ord(char) >= 0x80 for char in safe)
+        table = _encoding_tables[safe] = (pattern, octet_pattern, escapes,
+                                          text_escapes, wide)
+        return table
+
+
+class Encoded(text_type):
+    """ A string that is already percent encoded and which
+    :py:func:`percent_encode` will therefore pass through unchanged, after
+    checking that it contains only characters that would otherwise have
+    been left unencoded, plus `%XX` escapes:
+
+        >>> percent_encode(Encoded("a%2Fb"))
+        'a%2Fb'
+
+    """
+
+    __slots__ = ()
+
+
+_encoded_patterns = {}
+
+
+def _encoded_pattern(safe):
+    """ Fetch a pattern that matches the whole of a string if that string
+    is correctly encoded for a particular set of safe characters.
+    """
+    try:
+        return _encoded_patterns[safe]
+    except KeyError:
+        kept = "".join(sorted(set(unreserved + safe) - set("%")))
+        pattern = _encoded_patterns[safe] = re.compile(
+            "(?:[" + re.escape(kept) + "]|%[0-9A-Fa-f]{2})*\\Z")
+        return pattern
+
+
 # RFC 3986 § 2.1.
+def percent_encode_bytes(data, safe=None, out=None):
+    """ Percent encode a sequence of octets held in a `bytes`, `bytearray`
+    or `memoryview` object, optionally keeping certain (ASCII) characters
+    unencoded. The encoded octets are appended to `out`, a new `bytearray`
+    if none is supplied, which is then returned.
+
+    """
+    if out is None:
+        out = bytearray()
+    if isinstance(data, view_types) and bytes is str:
+        # Python 2 cannot search a memoryview with a regular expression.
+        data = data.tobytes()
+    octet_pattern, escapes = _encoding_table(safe or "")[1:3]
+    if octet_pattern.search(data) is None:
+        out += data
+    else:
+        # A bytearray yields ints on every Python version.
+        if not isinstance(data, bytearray):
+            data = bytearray(data)
+        out += b"".join(map(escapes.__getitem__, data))
+    return out
+
+
 def percent_encode(data, safe=None):
     """ Percent encode a string of data, optionally keeping certain characters
     unencoded.
 
     """
-    if data is None:
-        return None
-    if isinstance(data, (tuple, list, set)):
-        return "&".join(
-            percent_encode(value, safe=safe)
-            for value in data
-        )
-    if isinstance(data, dict):
-        return "&".join(
-            key + "=" + percent_encode(value, safe=safe)
-            for key, value in data.items()
-        )
+    if data.__class__ is not text_type:
+        # Plain text, by far the most common case, skips these checks.
+        if data is None:
+            return None
+        if isinstance(data, Encoded):
+            if _encoded_pattern(safe or "").match(data) is None:
+                raise ValueError("Encoded value {0} contains characters that "
+                                 "are not allowed here".format(repr(data)))
+            return data
+        if isinstance(data, (tuple, list, set)):
+            return "&".join(
+                percent_encode(value, safe=safe)
+                for value in data
+            )
+        if isinstance(data, dict):
+            return "&".join(
+                key + "=" + percent_encode(value, safe=safe)
+                for key, value in data.items()
+            )
+        data = ustr(data)
     if not safe:
         safe = ""
-    try:
-        chars = list(data)
-    except TypeError:
-        chars = list(ustr(data))
-    for i, char in enumerate(chars):
-        if char == "%" or (char not in unreserved and char not in safe):
-            chars[i] = "".join("%" + hex(b)[2:].upper().zfill(2)
-                               for b in bytearray(char, "utf-8"))
-    return "".join(chars)
+    pattern, _, _, escapes, wide = _encoding_table(safe)
+    if pattern.search(data) is None:
+        return data
+    if wide:
+        # Non-ASCII safe characters cannot be expressed as single octets so
+        # these have to be kept back before the remainder is encoded.
+        return "".join(
+            char if char in safe and char != "%"
+            else "".join(map(escapes.__getitem__, bytearray(char, "utf-8")))
+            for char in data
+        )
+    return "".join(map(escapes.__getitem__, bytearray(data, "utf-8")))
+
+
+# Octet values for every two-character hex code, in any mix of cases.
+_hex_octets = dict(
+    ((high + low).encode("ascii"), int(high + low, 16))
+    for high in "0123456789ABCDEFabcdef"
+    for low in "0123456789ABCDEFabcdef"
+)
+
+_percent_code = re.compile(br"%[0-9A-Fa-f]{2}|\+")
+
+
+def percent_decode_bytes(data, out=None):
+    """ Percent decode a sequence of octets held in a `bytes`, `bytearray`
+    or `memoryview` object. The decoded octets are appended to `out`, a new
+    `bytearray` if none is supplied, which is then returned.
+
+    """
+    if out is None:
+        out = bytearray()
+    if isinstance(data, view_types) and bytes is str:
+        # Python 2 cannot search a memoryview with a regular expression.
+        data = data.tobytes()
+    if isinstance(data, view_types):
+        # Views cannot be split, so copy across the runs between escapes
+        # directly from the underlying buffer instead.
+        start = 0
+        for match in _percent_code.finditer(data):
+            code = match.group()
+            out += data[start:match.start()]
+            out.append(0x20 if code == b"+" else _hex_octets[code[1:]])
+            start = match.end()
+        out += data[start:]
+        return out
+    if b"+" in data:
+        data = data.replace(b"+", b" ")
+    bits = data.split(b"%")
+    out += bits[0]
+    for bit in bits[1:]:
+        octet = _hex_octets.get(bytes(bit[:2]))
+        if octet is None:
+            out.append(0x25)
+            out += bit
+        else:
+            out.append(octet)
+            out += bit[2:]
+    return out
 
 
 def percent_decode(data):
@@ -84,26 +227,22 @@ def percent_decode(data):
     """
     if data is None:
         return None
-    percent_code = re.compile(r"(%[0-9A-Fa-f]{2}|\+)")
-    try:
-        bits = percent_code.split(data)
-    except TypeError:
-        bits = percent_code.split(ustr(data))
-    out = bytearray()
-    for bit in bits:
-        if bit.startswith("%"):
-            out.extend(bytearray([int(bit[1:], 16)]))
-        elif bit == "+":
-            out.append(32)
-        else:
-            out.extend(bytearray(bit, "utf-8"))
-    return out.decode("utf-8")
+    data = ustr(data)
+    if "%" not in data:
+        if "+" not in data:
+            return data
+        return data.replace("+", " ")
+    return percent_decode_bytes(data.encode("utf-8")).decode("utf-8")
 
 
 class Part(object):
     """ Internal base class for all URI component parts.
     """
 
+    # Parts are held in large numbers, so none of them carry a per-instance
+    # __dict__.
+    __slots__ = ("__weakref__",)
+
     @classmethod
     def _cast(cls, obj):
         """ Convert the object supplied to an instance of this class, if
@@ -119,6 +258,27 @@ class Part(object):
     def __init__(self):
         pass
 
+    def __getstate__(self):
+        # Gather every slot that has been set, under its mangled name.
+        # Python 2 will not pickle slotted objects without this.
+        state = {}
+        for cls in self.__class__.__mro__:
+            prefix = "_" + cls.__name__.lstrip("_")
+            for name in cls.__dict__.get("__slots__", ()):
+                if name.startswith("__") and not name.endswith("__"):
+                    name = prefix + name
+                elif name == "__weakref__":
+                    continue
+                try:
+                    state[name] = cls.__dict__[name].__get__(self, cls)
+                except AttributeError:
+                    pass
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def __repr__(self):
         return "{0}({1})".format(self.__class__.__name__, repr(self.string))
 
@@ -128,11 +288,13 @@ class Part(object):
     def __eq__(self, other):
         if other is None:
             return self.string is None
-        try:
-            other_string = other.string
-        except AttributeError:
-            other_string = self._cast(other).string
-        return self.string == other_string
+        if not isinstance(other, Part):
+            try:
+                other = other.string
+            except AttributeError:
+                pass
+            other = self._cast(other)
+        return self._canonical_string() == other._canonical_string()
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -149,85 +311,138 @@ class Part(object):
     def __iter__(self):
         return iter(self.string)
 
+    def _canonical_string(self):
+        """ The form of this part compared by equality and hashing. This is
+        the string value unless a part keeps text that other spellings of
+        the same value would serialise differently.
+        """
+        return self.string
+
     @property
     def string(self):
         raise NotImplementedError()
 
 
+# Text that is valid as it stands within a query (RFC 3986 § 3.4) and so can
+# be returned exactly as it was given.
+_query_text = re.compile(r"(?:[A-Za-z0-9\-._~!$&'()*+,;=:@/?]"
+                         r"|%[0-9A-Fa-f]{2})*\Z")
+
+
 class ParameterString(Part):
 
+    __slots__ = ("__separator", "__none", "__parameters", "__source",
+                 "__string", "__canonical")
+
+    #: The class used to hold parameters. This can be set to
+    #: :py:class:`CompactKeyValueList` to save memory where many instances
+    #: are kept, at some cost to the speed of lookups by key.
+    parameter_list = KeyValueList
+
     def __init__(self, string, separator):
         super(ParameterString, self).__init__()
         self.__separator = separator
         self.__none = string is None
-        self.__parameters = KeyValueList()
-        if string:
-            bits = string.split(self.__separator)
-            for bit in bits:
-                if "=" in bit:
-                    key, value = map(percent_decode,
-                                     bit.partition("=")[0::2])
-                else:
-                    key, value = percent_decode(bit), None
-                self.__parameters.append(key, value)
+        # Parameters are only decoded from the original string when first
+        # needed, and that string is kept as the serialised form as long as
+        # it is valid query text.
+        self.__parameters = None
+        self.__source = string or ""
+        self.__string = None
+        self.__canonical = None
+
+    def __parsed(self):
+        parameters = self.__parameters
+        if parameters is None:
+            parameters = self.__parameters = self.parameter_list()
+            if self.__source:
+                for bit in self.__source.split(self.__separator):
+                    if "=" in bit:
+                        key, value = map(percent_decode,
+                                         bit.partition("=")[0::2])
+                    else:
+                        key, value = percent_decode(bit), None
+                    parameters.append(key, value)
+        return parameters
 
     def __len__(self):
-        return self.__parameters.__len__()
+        return self.__parsed().__len__()
 
     def __bool__(self):
+        if self.__parameters is None:
+            return bool(self.__source)
         return bool(self.__parameters)
 
     def __nonzero__(self):
-        return bool(self.__parameters)
+        return self.__bool__()
 
     def __contains__(self, item):
-        return self.__parameters.__contains__(item)
+        return self.__parsed().__contains__(item)
 
     def __hash__(self):
-        return hash(self.string)
+        return hash(self._canonical_string())
 
     def __iter__(self):
-        return self.__parameters.__iter__()
+        return self.__parsed().__iter__()
 
     def __getitem__(self, index):
         if isinstance(index, slice):
             out = ParameterString("", self.__separator)
-            out.__parameters.extend(self.__parameters.__getitem__(index))
+            out.__parsed().extend(self.__parsed().__getitem__(index))
+            out.__source = None
             return out
         else:
-            return self.__parameters.__getitem__(index)
+            return self.__parsed().__getitem__(index)
 
     def __getslice__(self, start, stop):
         out = ParameterString("", self.__separator)
-        out.__parameters.extend(self.__parameters.__getslice__(start, stop))
+        out.__parsed().extend(self.__parsed().__getslice__(start, stop))
+        out.__source = None
         return out
 
     def get(self, name, index=0):
-        if not self.__parameters.has_key(name):
+        values = list(self.__parsed().get(name))
+        if not values:
             raise KeyError(name)
-        for i, value in enumerate(self.__parameters.get(name)):
-            if i == index:
-                return value
+        if 0 <= index < len(values):
+            return values[index]
         raise IndexError("Parameter {0} does not have {1} "
                          "values".format(name, index))
 
     def get_all(self, name):
-        if not self.__parameters.has_key(name):
+        values = list(self.__parsed().get(name))
+        if not values:
             raise KeyError(name)
-        return list(self.__parameters.get(name))
+        return values
 
-    @property
-    def string(self):
-        if self.__none:
-            return None
+    def __serialise(self):
         bits = []
-        for key, value in self.__parameters:
+        for key, value in self.__parsed():
             if value is None:
                 bits.append(percent_encode(key))
             else:
                 bits.append(percent_encode(key) + "=" + percent_encode(value))
         return self.__separator.join(bits)
 
+    def _canonical_string(self):
+        if self.__none:
+            return None
+        if self.__canonical is None:
+            self.__canonical = self.__serialise()
+        return self.__canonical
+
+    @property
+    def string(self):
+        if self.__none:
+            return None
+        if self.__string is None:
+            source = self.__source
+            if source is not None and _query_text.match(source):
+                self.__string = source
+            else:
+                self.__string = self.__serialise()
+        return self.__string
+
 
 class Authority(Part):
     """ A host name plus optional port and user information detail.
@@ -241,6 +456,8 @@ class Authority(Part):
     .. _`RFC 3986 § 3.2`: http://tools.ietf.org/html/rfc3986#section-3.2
     """
 
+    __slots__ = ("__user_info", "__host", "__port", "__string")
+
     @classmethod
     def _parse_host_port(cls, string):
         if ":" in string:
@@ -251,8 +468,19 @@ class Authority(Part):
             port = None
         return host, port
 
+    @classmethod
+    def _build(cls, user_info, host, port):
+        """ Create an authority directly from its (already decoded) parts.
+        """
+        authority = cls(None)
+        authority.__user_info = user_info
+        authority.__host = host
+        authority.__port = port
+        return authority
+
     def __init__(self, string):
         super(Authority, self).__init__()
+        self.__string = None
         if string is None:
             self.__user_info = None
             self.__host = None
@@ -367,13 +595,15 @@ class Authority(Part):
         """
         if self.__host is None:
             return None
-        u = []
-        if self.__user_info is not None:
-            u += [percent_encode(self.__user_info), "@"]
-        u += [self.__host]
-        if self.__port is not None:
-            u += [":", ustr(self.__port)]
-        return "".join(u)
+        if self.__string is None:
+            u = []
+            if self.__user_info is not None:
+                u += [percent_encode(self.__user_info), "@"]
+            u += [self.__host]
+            if self.__port is not None:
+                u += [":", ustr(self.__port)]
+            self.__string = "".join(u)
+        return self.__string
         
     @property
     def user_info(self):
@@ -402,8 +632,11 @@ class Authority(Part):
 
 class Path(Part):
 
+    __slots__ = ("__segments", "__string")
+
     def __init__(self, string):
         super(Path, self).__init__()
+        self.__string = None
         if string is None:
             self.__segments = None
         else:
@@ -416,7 +649,9 @@ class Path(Part):
     def string(self):
         if self.__segments is None:
             return None
-        return "/".join(map(percent_encode, self.__segments))
+        if self.__string is None:
+            self.__string = "/".join(map(percent_encode, self.__segments))
+        return self.__string
 
     @property
     def segments(self):
@@ -480,13 +715,15 @@ class Path(Part):
 
 class Query(ParameterString):
 
+    __slots__ = ()
+
     SEPARATOR = "&"
 
     def __init__(self, string):
         super(Query, self).__init__(string, self.SEPARATOR)
 
     def __hash__(self):
-        return hash(self.string)
+        return hash(self._canonical_string())
 
 
 class URI(Part):
@@ -498,6 +735,32 @@ class URI(Part):
     .. _`RFC 3986`: http://tools.ietf.org/html/rfc3986
     """
 
+    __slots__ = ("__source", "__spans", "__string", "__canonical", "__scheme",
+                 "__authority", "__path", "__query", "__fragment")
+
+    # Splits a URI into all of its components in a single pass. Each
+    # delimiter is taken from the same place as the original cascade of
+    # partitions would have found it: the scheme ends at the first ':', the
+    # fragment starts at the first '#', the query at the first '?' before
+    # that and user information ends at the last '@' in the authority.
+    _parser = re.compile(r"""
+        (?:([^:]*):)?                   # scheme
+        (//                             # authority
+            (?:([^/?#]*)@)?             #   user_info
+            (?:([^/?#]*):([^/?#:]*)     #   host ":" port
+              |([^/?#]*))               #   or host alone
+        )?
+        ([^?#]*)                        # path
+        (?:\?([^#]*))?                  # query
+        (?:\#(.*))?                     # fragment
+    """, re.VERBOSE | re.DOTALL)
+
+    # Finds the port as the parser above would, without matching the rest
+    # of the URI. There can only be a port if there is a scheme, as both
+    # need a ':', and user information runs up to the last '@'.
+    _port_parser = re.compile(
+        r"[^:]*://(?:[^/?#]*@)?[^/?#@]*:([^/?#:@]*)(?![^/?#])", re.DOTALL)
+
     @classmethod
     def build(cls, **parts):
         """ Build a URI object from named parts. The part names available are:
@@ -532,6 +795,29 @@ class URI(Part):
             uri.__path = Path("")
         return uri
 
+    #: Shared URI instances returned by :py:meth:`parse` when caching is
+    #: requested. The size can be changed through ``parse_cache.max_size``
+    #: and hit, miss and eviction counts are available as attributes.
+    parse_cache = LRUCache(max_size=1024)
+
+    @classmethod
+    def parse(cls, value, cache=False):
+        """ Parse a string into a URI object. If `cache` is true, the URI is
+        taken from (or added to) the shared parse cache so that repeated
+        strings share a single, already-parsed instance.
+
+        URI objects offer no means of modification, so these shared
+        instances can safely be handed to any number of callers; building
+        or resolving new URIs from them leaves them untouched.
+        """
+        if not cache or not isinstance(value, text_type):
+            return cls(value)
+        uri = cls.parse_cache.get(value)
+        if uri is None:
+            uri = cls(value)
+            cls.parse_cache.put(value, uri)
+        return uri
+
     @classmethod
     def _partition_fragment(cls, value):
         if "#" in value:
@@ -566,23 +852,88 @@ class URI(Part):
             path = Path(value)
         return authority, path
 
+    # Names of the lazily built component attributes, mapped onto the names
+    # of the class methods that build them.
+    _builders = {
+        "_URI__scheme": "_build_scheme",
+        "_URI__authority": "_build_authority",
+        "_URI__path": "_build_path",
+        "_URI__query": "_build_query",
+        "_URI__fragment": "_build_fragment",
+    }
+
+    @classmethod
+    def _spans(cls, source):
+        """ Match a source string, returning the start and end of each
+        component group in a single flat array, of two-byte offsets where
+        the source is short enough.
+        """
+        match = cls._parser.match(source)
+        return array(str("h") if len(source) < 0x8000 else str("l"),
+                     [i for group in range(1, 10) for i in match.span(group)])
+
+    @classmethod
+    def _group(cls, source, spans, group):
+        start = spans[2 * group - 2]
+        if start < 0:
+            return None
+        return source[start:spans[2 * group - 1]]
+
+    @classmethod
+    def _build_scheme(cls, source, spans):
+        scheme = cls._group(source, spans, 1)
+        if scheme is None:
+            return None
+        return percent_decode(scheme)
+
+    @classmethod
+    def _build_authority(cls, source, spans):
+        authority, user_info, host, port, host_only = (
+            cls._group(source, spans, group) for group in range(2, 7))
+        if authority is None:
+            return None
+        if user_info is not None:
+            user_info = percent_decode(user_info)
+        if host is None:
+            return Authority._build(user_info, host_only, None)
+        return Authority._build(user_info, host, int(port))
+
+    @classmethod
+    def _build_path(cls, source, spans):
+        return Path(cls._group(source, spans, 7))
+
+    @classmethod
+    def _build_query(cls, source, spans):
+        query = cls._group(source, spans, 8)
+        if query is None:
+            return None
+        return Query(query)
+
+    @classmethod
+    def _build_fragment(cls, source, spans):
+        fragment = cls._group(source, spans, 9)
+        if fragment is None:
+            return None
+        return percent_decode(fragment)
+
     def __init__(self, value):
         super(URI, self).__init__()
+        self.__source = None
+        self.__spans = None
+        self.__string = None
+        self.__canonical = None
         if isinstance(value, URI):
             self.__scheme = value.__scheme
             self.__authority = value.__authority
             self.__path = value.__path
             self.__query = value.__query
             self.__fragment = value.__fragment
-        else:
-            self.__scheme = None
-            self.__authority = None
-            self.__path = None
-            self.__query = None
-            self.__fragment = None
+            self.__string = value.__string
+            return
+        if not isinstance(value, text_type):
             try:
                 if value.__uri__ is None:
-                    return
+                    value = None
             except AttributeError:
                 pass
             if value is not None:
@@ -590,21 +941,51 @@ class URI(Part):
                     value = ustr(value.__uri__)
                 except AttributeError:
                     value = ustr(value)
-                # scheme
-                if ":" in value:
-                    self.__scheme, value = value.partition(":")[0::2]
-                    self.__scheme = percent_decode(self.__scheme)
-                else:
-                    self.__scheme = None
-                # fragment
-                value, self.__fragment = self._partition_fragment(value)
-                # query
-                value, self.__query = self._partition_query(value)
-                # hierarchical part
-                self.__authority, self.__path = self._parse_hierarchical_part(value)
+        if value is None:
+            self.__scheme = None
+            self.__authority = None
+            self.__path = None
+            self.__query = None
+            self.__fragment = None
+        else:
+            # Only the source string is kept here; the components are
+            # built from it on first access (see `__getattr__`). The port is
+            # checked straight away though, so that a bad one is still
+            # reported by the constructor.
+            self.__source = value
+            port = self._port_parser.match(value)
+            if port is not None:
+                int(port.group(1))
+
+    def __getattr__(self, name):
+        try:
+            build = getattr(self, self._builders[name])
+        except KeyError:
+            raise AttributeError(name)
+        source = self.__source
+        if source is None:
+            raise AttributeError(name)
+        # The source is matched again on first access, rather than holding
+        # on to the match object from __init__, which would more than double
+        # the size of an unread URI. Only the offsets are kept from then on.
+        spans = self.__spans
+        if spans is None:
+            spans = self.__spans = self._spans(source)
+        value = build(source, spans)
+        setattr(self, name, value)
+        return value
 
     def __hash__(self):
-        return hash(self.string)
+        return hash(self._canonical_string())
+
+    def _canonical_string(self):
+        if self.__canonical is None:
+            if self.__query is None:
+                self.__canonical = self.string
+            else:
+                self.__canonical = self.__compose(
+                    self.__query._canonical_string())
+        return self.__canonical
 
     @property
     def __uri__(self):
@@ -612,60 +993,85 @@ class URI(Part):
 
     def __set_hierarchical_part(self, string):
         if string is not None:
+            self.__string = None
+            self.__canonical = None
             self.__authority, self.__path = self._parse_hierarchical_part(string)
 
     def __set_absolute_path_reference(self, string):
         if string is not None:
+            self.__string = None
+            self.__canonical = None
             string, self.__fragment = self._partition_fragment(string)
             string, self.__query = self._partition_query(string)
             self.__path = Path(string)
 
     def __set_authority(self, string):
         if string is not None:
+            self.__string = None
+            self.__canonical = None
             self.__authority = Authority(string)
 
     def __set_host_port(self, string):
         if string is not None:
+            self.__string = None
+            self.__canonical = None
             if self.__authority is None:
                 self.__authority = Authority(string)
             else:
                 host, port = Authority._parse_host_port(string)
-                self.__authority._Authority__host = host
-                self.__authority._Authority__port = port
+                self.__authority = Authority._build(
+                    self.__authority.user_info, host, port)
 
     def __set_scheme(self, string):
         if string is not None:
+            self.__string = None
+            self.__canonical = None
             self.__scheme = string
 
     def __set_user_info(self, string):
         if string is not None:
+            self.__string = None
+            self.__canonical = None
             if self.__authority is None:
                 self.__authority = Authority("")
-            self.__authority._Authority__user_info = string
+            self.__authority = Authority._build(
+                string, self.__authority.host, self.__authority.port)
 
     def __set_host(self, string):
         if string is not None:
+            self.__string = None
+            self.__canonical = None
             if self.__authority is None:
                 self.__authority = Authority(string)
             else:
-                self.__authority._Authority__host = string
+                self.__authority = Authority._build(
+                    self.__authority.user_info, string, self.__authority.port)
 
     def __set_port(self, number):
         if number is not None:
+            self.__string = None
+            self.__canonical = None
             if self.__authority is None:
                 self.__authority = Authority("")
-            self.__authority._Authority__port = number
+            self.__authority = Authority._build(
+                self.__authority.user_info, self.__authority.host, number)
 
     def __set_path(self, string):
         if string is not None:
+            self.__string = None
+            self.__canonical = None
             self.__path = Path(string)
 
     def __set_query(self, string):
         if string is not None:
+            self.__string = None
+            self.__canonical = None
             self.__query = Query(string)
 
     def __set_fragment(self, string):
         if string is not None:
+            self.__string = None
+            self.__canonical = None
             self.__fragment = string
 
     @property
@@ -701,6 +1107,13 @@ class URI(Part):
             string, even when the URI is undefined; in this case, an empty
             string is returned instead of :py:const:`None`.
         """
+        if self.__string is None:
+            query = self.__query
+            self.__string = self.__compose(None if query is None
+                                           else query.string)
+        return self.__string
+
+    def __compose(self, query):
         if self.__path is None:
             return None
         u = []
@@ -709,8 +1122,8 @@ class URI(Part):
         if self.__authority is not None:
             u += ["//", ustr(self.__authority)]
         u += [ustr(self.__path)]
-        if self.__query is not None:
-            u += ["?", ustr(self.__query)]
+        if query is not None:
+            u += ["?", query]
         if self.__fragment is not None:
             u += ["#", percent_encode(self.__fragment)]
         return "".join(u)
@@ -23,12 +23,21 @@ An implementation of URI Templates from RFC 6570.
 
 from __future__ import unicode_literals
 
+try:
+    from collections.abc import Iterator, Mapping
+except ImportError:
+    from collections import Iterator, Mapping
+from bisect import bisect_left
+from functools import partial
+from itertools import chain, repeat
 import re
 
-from .rfc3986 import reserved, percent_encode, Part, URI
+from .rfc3986 import (reserved, percent_encode, percent_decode, Encoded,
+                      Part, URI, _encoding_table)
+from .util import LRUCache, text_type, ustr
 
 
-__all__ = ["URITemplate"]
+__all__ = ["URITemplate", "URITemplateRouter"]
 
 
 class URITemplate(Part):
@@ -38,6 +47,9 @@ class URITemplate(Part):
     This class exposes a full implementation of RFC6570.
     """
 
+    __slots__ = ("__template", "__program", "__function", "__memoising",
+                 "__matcher", "__bound", "__cache", "__cache_names")
+
     @classmethod
     def __cast(cls, obj):
         if obj is None:
@@ -47,110 +59,650 @@ class URITemplate(Part):
         else:
             return cls(str(obj))
 
-    class _Expander(object):
+    class _Variable(object):
+        """ A single variable from an expression, along with its modifiers
+        and the encoding rules of the expression's operator.
+        """
+
+        __slots__ = ("name", "explode", "max_length", "safe", "named",
+                     "trim_empty_equals", "items")
+
+        def __init__(self, spec, safe=None, named=False,
+                     trim_empty_equals=False):
+            if spec.endswith("*"):
+                spec, self.explode = spec[:-1], True
+            else:
+                self.explode = False
+            if ":" in spec:
+                spec, max_length = spec.partition(":")[0::2]
+                self.max_length = int(max_length)
+            else:
+                self.max_length = None
+            self.name = spec
+            self.safe = safe
+            self.named = named
+            self.trim_empty_equals = trim_empty_equals
+            # Pre-rendered items for a variable bound by `partial`.
+            self.items = None
+
+        def __getstate__(self):
+            return tuple(getattr(self, name) for name in self.__slots__)
+
+        def __setstate__(self, state):
+            for name, value in zip(self.__slots__, state):
+                setattr(self, name, value)
+
+        def __str__(self):
+            spec = self.name
+            if self.max_length is not None:
+                spec += ":{0}".format(self.max_length)
+            if self.explode:
+                spec += "*"
+            return spec
 
-        _operators = set("+#./;?&")
+        _encoded_character = re.compile(r"%[0-9A-Fa-f]{2}|.", re.DOTALL)
 
-        def __init__(self, values):
-            self.values = values
+        def render(self, value):
+            """ Render a value for this variable into a list of encoded
+            items, to be joined by the expression's separator. An undefined
+            value renders to no items at all.
+            """
+            return list(self.iterate(value))
 
-        def collect(self, *keys):
-            """ Fetch a list of all values matching the keys supplied,
-            returning (key, value) pairs for each.
+        def iterate(self, value):
+            """ Generate the encoded items for a value one at a time. Any
+            mapping or (non-string) iterable is accepted as a composite
+            value and is only consumed as items are generated.
             """
+            if value is None:
+                return
+            safe = self.safe
+            if isinstance(value, Mapping):
+                pairs = iter(value.items())
+                if self.explode:
+                    for pair in pairs:
+                        yield "=".join(percent_encode(x, safe) for x in pair)
+                    return
+                first = next(pairs, None)
+                if first is None:
+                    return
+                item = ",".join(",".join(percent_encode(x, safe) for x in pair)
+                                for pair in chain((first,), pairs))
+            elif _is_composite(value):
+                if self.explode:
+                    for x in value:
+                        piece = self.__join(x)
+                        if piece is not None:
+                            yield self.__key(piece)
+                    return
+                item = ",".join(percent_encode(x, safe) for x in value)
+            elif self.max_length is not None and isinstance(value, Encoded):
+                # Escapes count as single characters and are kept whole.
+                item = percent_encode(Encoded("".join(
+                    self._encoded_character.findall(value)[:self.max_length]
+                )), safe)
+            elif self.max_length is not None:
+                item = percent_encode(ustr(value)[:self.max_length], safe)
+            else:
+                item = percent_encode(value, safe)
+            yield self.__key(item)
+
+        def render_all(self, column):
+            """ Render a sequence of values into a list of item lists,
+            rendering each distinct (hashable) value only once.
+            """
+            memo = {}
+            return [self.render_memo(value, memo) for value in column]
+
+        def render_memo(self, value, memo):
+            """ Render a value, reusing the items held in the dictionary
+            `memo` for an equal value (of the same types) rendered before.
+            The memo is emptied whenever it grows beyond a fixed size.
+            """
+            try:
+                key = _cache_key(value)
+                return memo[key]
+            except KeyError:
+                if len(memo) >= _memo_size:
+                    memo.clear()
+                items = memo[key] = self.render(value)
+                return items
+            except TypeError:
+                return self.render(value)
+
+        def __join(self, value):
+            if _is_composite(value) and not isinstance(value, Mapping):
+                return ",".join(percent_encode(x, self.safe) for x in value)
+            else:
+                return percent_encode(value, self.safe)
+
+        def __key(self, item):
+            if not self.named:
+                return item
+            key = percent_encode(self.name, self.safe)
+            if item == "" and self.trim_empty_equals:
+                return key
+            return key + "=" + item
+
+    class _Expression(object):
+        """ A pre-analysed template expression, holding the prefix and
+        separator for its operator plus the list of variables it contains.
+        """
+
+        __slots__ = ("operator", "prefix", "separator", "named",
+                     "variables")
+
+        # operator: (prefix, separator, safe, named, trim_empty_equals)
+        _operators = {
+            "+": ("", ",", reserved, False, False),
+            "#": ("#", ",", reserved, False, False),
+            ".": (".", ".", None, False, False),
+            "/": ("/", "/", None, False, False),
+            ";": (";", ";", None, True, True),
+            "?": ("?", "&", None, True, False),
+            "&": ("&", "&", None, True, False),
+        }
+
+        def __init__(self, expression):
+            if expression[:1] in self._operators:
+                self.operator, expression = expression[0], expression[1:]
+                (self.prefix, self.separator, safe, named,
+                 trim_empty_equals) = self._operators[self.operator]
+            else:
+                self.operator = ""
+                self.prefix, self.separator = "", ","
+                safe, named, trim_empty_equals = None, False, False
+            self.named = named
+            self.variables = [
+                URITemplate._Variable(spec, safe, named, trim_empty_equals)
+                for spec in expression.split(",")
+            ]
+
+        def __str__(self):
+            specs = ",".join(map(str, self.variables))
+            return "{" + self.operator + specs + "}"
+
+        def __getstate__(self):
+            return tuple(getattr(self, name) for name in self.__slots__)
+
+        def __setstate__(self, state):
+            for name, value in zip(self.__slots__, state):
+                setattr(self, name, value)
+
+        def expand(self, values):
             items = []
-            for key in keys:
-                if key.endswith("*"):
-                    key, explode = key[:-1], True
+            for variable in self.variables:
+                if variable.items is None:
+                    items.extend(variable.render(values.get(variable.name)))
                 else:
-                    explode = False
-                if ":" in key:
-                    key, max_length = key.partition(":")[0::2]
-                    max_length = int(max_length)
+                    items.extend(variable.items)
+            if not items:
+                return ""
+            return self.prefix + self.separator.join(items)
+
+        def write(self, write, values):
+            """ Expand this expression piece by piece through the function
+            `write`, without collecting the items first.
+            """
+            delimiter = self.prefix
+            for variable in self.variables:
+                if variable.items is None:
+                    items = variable.iterate(values.get(variable.name))
                 else:
-                    max_length = None
-                value = self.values.get(key)
-                if isinstance(value, dict):
-                    if not value:
-                        items.append((key, None))
-                    elif explode:
-                        items.extend((key, _) for _ in value.items())
-                    else:
-                        items.append((key, value))
-                elif isinstance(value, (tuple, list)):
-                    if explode:
-                        items.extend((key, _) for _ in value)
-                    else:
-                        items.append((key, list(value)))
-                elif max_length is not None:
-                    items.append((key, value[:max_length]))
+                    items = variable.items
+                for item in items:
+                    write(delimiter)
+                    write(item)
+                    delimiter = self.separator
+
+        def expand_all(self, columns, count):
+            """ Expand this expression once for each of `count` rows, taking
+            the values for each variable from the corresponding column.
+            """
+            rendered = []
+            for variable in self.variables:
+                if variable.items is not None:
+                    rendered.append(repeat(variable.items, count))
+                elif variable.name in columns:
+                    column = columns[variable.name]
+                    rendered.append(variable.render_all(column))
                 else:
-                    items.append((key, value))
-            return [(key, value) for key, value in items if value is not None]
-
-        def _expand(self, expression, safe=None, prefix="", separator=",",
-                    with_keys=False, trim_empty_equals=False):
-            items = self.collect(*expression.split(","))
-            encode = lambda x: percent_encode(x, safe=safe)
-            for i, (key, value) in enumerate(items):
-                if isinstance(value, tuple):
-                    items[i] = "=".join(map(encode, value))
+                    rendered.append(repeat([], count))
+            prefix, join = self.prefix, self.separator.join
+            strings = []
+            for row in zip(*rendered):
+                items = [item for items in row for item in items]
+                strings.append(prefix + join(items) if items else "")
+            return strings
+
+        # Characters other than escapes that can appear within a single
+        # expanded item, for unreserved and reserved expansion respectively.
+        # Reserved items are not allowed to run on into a query or fragment.
+        _unreserved_item = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+                                     "abcdefghijklmnopqrstuvwxyz"
+                                     "0123456789-._~,=")
+        _reserved_item = _unreserved_item | frozenset("!$&'()*+;:/@[]")
+        _fragment_item = _reserved_item | frozenset("?")
+
+        def scanner(self):
+            """ Describe any text this expression could have expanded to, as
+            a tuple of the prefix that starts any non-empty text, the set of
+            characters that may follow it (along with escapes) and, where
+            its items are counted, the separator and the most separators
+            that may follow the prefix.
+            """
+            if self.operator == "+":
+                return "", self._reserved_item, None, None
+            elif self.operator == "#":
+                return "#", self._fragment_item, None, None
+            chars = self._unreserved_item
+            if self.separator in chars:
+                return self.prefix, chars, None, None
+            chars = chars | frozenset(self.separator)
+            if any(variable.explode for variable in self.variables):
+                return self.prefix, chars, None, None
+            return self.prefix, chars, self.separator, len(self.variables) - 1
+
+        @classmethod
+        def _decode(cls, value):
+            # A '+' can only appear here through reserved expansion, where
+            # it stands for itself rather than a space.
+            return percent_decode(value.replace("+", "%2B"))
+
+        def bind(self, text, values):
+            """ Extract variable values from the text captured by this
+            expression's pattern and add them to `values`, returning False
+            if the text cannot be accounted for.
+            """
+            variables = self.variables
+            if not text:
+                # Variables bound by `partial` would have left some text.
+                return not any(variable.items for variable in variables)
+            text = text[len(self.prefix):]
+            decode = self._decode
+            if self.named:
+                parts = text.split(self.separator)
+                for variable in variables:
+                    for item in variable.items or ():
+                        pair = tuple(map(decode, item.partition("=")[0::2]))
+                        for i, part in enumerate(parts):
+                            if tuple(map(decode,
+                                         part.partition("=")[0::2])) == pair:
+                                del parts[i]
+                                break
+                        else:
+                            return False
+                variables = [variable for variable in variables
+                             if variable.items is None]
+                exploded = [variable for variable in variables
+                            if variable.explode]
+                names = dict((variable.name, variable)
+                             for variable in variables)
+                pairs = [tuple(map(decode, part.partition("=")[0::2]))
+                         for part in parts]
+                # Keys that belong to no variable can only come from the
+                # first exploded variable, which must then have been a
+                # mapping, and its own name is just another of its keys.
+                if any(key not in names for key, _ in pairs):
+                    if not exploded:
+                        return False
+                    mapped = exploded[0]
                 else:
-                    if isinstance(value, dict):
-                        items[i] = ",".join(",".join(map(encode, item))
-                                            for item in value.items())
-                    elif isinstance(value, list):
-                        items[i] = ",".join(map(encode, value))
+                    mapped = None
+                seen = set()
+                for key, value in pairs:
+                    variable = names.get(key)
+                    if variable is None or variable is mapped:
+                        mapping = values.setdefault(mapped.name, {})
+                        if not isinstance(mapping, dict) or key in seen:
+                            return False
+                        mapping[key] = value
+                        seen.add(key)
+                    elif variable.explode:
+                        items = values.setdefault(key, [])
+                        if not isinstance(items, list):
+                            return False
+                        items.append(value)
+                    elif key in seen:
+                        return False
                     else:
-                        items[i] = encode(value)
-                    if with_keys:
-                        if items[i] is None or (items[i] == "" and
-                                                trim_empty_equals):
-                            items[i] = encode(key)
+                        values[key] = value
+                        seen.add(key)
+                return True
+            if len(variables) == 1 and not variables[0].explode:
+                values[variables[0].name] = decode(text)
+                return True
+            parts = text.split(self.separator)
+            # The parts that each variable bound by `partial` must account
+            # for, or None for a variable that is still open.
+            fixed = [None if variable.items is None
+                     else self.separator.join(variable.items).split(
+                         self.separator) if variable.items else []
+                     for variable in variables]
+            start = 0
+            for i, variable in enumerate(variables):
+                if fixed[i] is not None:
+                    end = start + len(fixed[i])
+                    if list(map(decode, parts[start:end])) != \
+                            list(map(decode, fixed[i])):
+                        return False
+                    start = end
+                    continue
+                if start >= len(parts):
+                    continue
+                later = fixed[i + 1:]
+                bound = sum(len(other) for other in later if other is not None)
+                if variable.explode:
+                    end = max(len(parts) - bound - later.count(None), start)
+                    values[variable.name] = list(map(decode, parts[start:end]))
+                    start = end
+                elif len(parts) - start > bound:
+                    values[variable.name] = decode(parts[start])
+                    start += 1
+            return start == len(parts)
+
+    class _Product(object):
+        """ The expansions of a template over the cartesian product of some
+        sequences of values, as returned by
+        :py:meth:`URITemplate.expand_product`. Expansions are produced
+        lazily, in the same order as :py:func:`itertools.product`, and can
+        be indexed or sliced without producing those that come before.
+        """
+
+        __slots__ = ("__sizes", "__length", "__parts", "__updates")
+
+        def __init__(self, program, iterables):
+            # Variables are taken in the order they appear in the template,
+            # rather than that of the keyword arguments, which Python 2
+            # does not keep. Any others follow in sorted order.
+            names = []
+            for piece in program or ():
+                if isinstance(piece, text_type):
+                    continue
+                for variable in piece.variables:
+                    if variable.name in iterables and \
+                            variable.name not in names:
+                        names.append(variable.name)
+            names.extend(sorted(set(iterables) - set(names)))
+            values = [list(iterables[name]) for name in names]
+            self.__sizes = [len(column) for column in values]
+            self.__length = 1
+            for size in self.__sizes:
+                self.__length *= size
+            if program is None:
+                self.__parts = self.__updates = None
+                return
+            # Each part of an expansion is either fixed text or is produced
+            # by a function of the current value indexes, and is registered
+            # against each index it depends on.
+            self.__parts, self.__updates = [], [[] for _ in names]
+            for piece in program:
+                if isinstance(piece, text_type):
+                    self.__parts.append(piece)
+                    continue
+                used = sorted(set(
+                    names.index(variable.name) for variable in piece.variables
+                    if variable.items is None and variable.name in iterables
+                ))
+                if not used:
+                    self.__parts.append(piece.expand({}))
+                    continue
+                if len(used) == 1:
+                    i = used[0]
+                    table = [piece.expand({names[i]: value})
+                             for value in values[i]]
+                    update = self.__lookup(table, i)
+                else:
+                    tables = []
+                    for variable in piece.variables:
+                        if variable.items is not None:
+                            tables.append((None, variable.items))
+                        elif variable.name in iterables:
+                            i = names.index(variable.name)
+                            tables.append((i, [variable.render(value)
+                                               for value in values[i]]))
                         else:
-                            items[i] = encode(key) + "=" + (items[i] or "")
-            out = []
-            for i, item in enumerate(items):
-                out.append(prefix if i == 0 else separator)
-                out.append(item)
-            return "".join(out)
-
-        def expand(self, expression):
-            """ Dispatch to the correct expansion method.
-            """
-            if not expression:
-                return ""
-            if expression[0] in self._operators:
-                operator, expression = expression[0], expression[1:]
-                if operator == "+":
-                    return self._expand(expression, reserved)
-                elif operator == "#":
-                    return self._expand(expression, reserved, prefix="#")
-                elif operator == ".":
-                    return self._expand(expression, prefix=".", separator=".")
-                elif operator == "/":
-                    return self._expand(expression, prefix="/", separator="/")
-                elif operator == ";":
-                    return self._expand(expression, prefix=";", separator=";",
-                                        with_keys=True, trim_empty_equals=True)
-                elif operator == "?":
-                    return self._expand(expression, prefix="?", separator="&",
-                                        with_keys=True)
-                elif operator == "&":
-                    return self._expand(expression, prefix="&", separator="&",
-                                        with_keys=True)
-            else:
-                return self._expand(expression)
+                            tables.append((None, []))
+                    update = self.__join(piece, tables)
+                for i in used:
+                    self.__updates[i].append((len(self.__parts), update))
+                self.__parts.append(None)
+
+        @staticmethod
+        def __lookup(table, i):
+            return lambda indexes: table[indexes[i]]
+
+        @staticmethod
+        def __join(piece, tables):
+            prefix, join = piece.prefix, piece.separator.join
+
+            def update(indexes):
+                items = []
+                for i, table in tables:
+                    items.extend(table if i is None else table[indexes[i]])
+                return prefix + join(items) if items else ""
+
+            return update
+
+        def __len__(self):
+            return self.__length
+
+        def __iter__(self):
+            return self.__expand(0, self.__length)
+
+        def __getitem__(self, index):
+            if isinstance(index, slice):
+                start, stop, step = index.indices(self.__length)
+                if step == 1:
+                    return self.__expand(start, stop)
+                return (self[i] for i in range(start, stop, step))
+            if index < 0:
+                index += self.__length
+            if not 0 <= index < self.__length:
+                raise IndexError("Expansion index out of range")
+            return next(self.__expand(index, index + 1))
+
+        def __expand(self, start, stop):
+            if start >= stop:
+                return
+            if self.__parts is None:
+                for _ in range(start, stop):
+                    yield None
+                return
+            sizes, updates = self.__sizes, self.__updates
+            indexes = [0] * len(sizes)
+            offset = start
+            for i in reversed(range(len(sizes))):
+                offset, indexes[i] = divmod(offset, sizes[i])
+            parts = list(self.__parts)
+            for column in updates:
+                for position, update in column:
+                    parts[position] = update(indexes)
+            for _ in range(start, stop - 1):
+                yield "".join(parts)
+                # Advance the indexes like an odometer, then refresh only
+                # those parts that depend on an index that has changed.
+                i = len(sizes) - 1
+                while True:
+                    indexes[i] += 1
+                    if indexes[i] < sizes[i]:
+                        break
+                    indexes[i] = 0
+                    i -= 1
+                for column in updates[i:]:
+                    for position, update in column:
+                        parts[position] = update(indexes)
+            yield "".join(parts)
+
+    _non_ascii = re.compile(r"[^\x00-\x7F]+")
+
+    _tokeniser = re.compile(r"(\{)([^{}]*)(\})")
+
+    @classmethod
+    def _parse(cls, template):
+        """ Parse a template string into a program of literal strings and
+        expressions, ready for repeated expansion.
+        """
+        program = []
+        tokens = cls._tokeniser.split(template)
+        for i in range(0, len(tokens), 4):
+            if tokens[i]:
+                program.append(tokens[i])
+            if i + 2 < len(tokens) and tokens[i + 2]:
+                program.append(cls._Expression(tokens[i + 2]))
+        return program
+
+    @classmethod
+    def _generate(cls, program, memoise=False):
+        """ Generate the source of a function specialised for expanding a
+        particular program, along with the namespace it should be executed
+        in. Literals and encoded key names are inlined and plain string
+        values are encoded directly; any other value is handed over to the
+        variable's own `render` method.
+
+        If `memoise` is true, the source instead defines a function that
+        takes no arguments and returns a fresh expansion function, which
+        keeps the values it encodes or renders in memos of its own and
+        reuses the results when the same values come round again.
+        """
+        namespace = {"_text": text_type, "_encode": percent_encode}
+        setup = ["def load():",
+                 "    _encode = _memoised(_percent_encode)"]
+        if memoise:
+            namespace.update(_memoised=_memoised, _partial=partial,
+                             _percent_encode=percent_encode)
+        searches = {}
+        lines = ["def expand(**values):"]
+        pieces = []
+        for i, piece in enumerate(program):
+            if isinstance(piece, text_type):
+                pieces.append(repr(piece))
+                continue
+            single = (len(piece.variables) == 1 and
+                      piece.variables[0].items is None)
+            joined = "{0!r}.join(items)".format(piece.separator)
+            if piece.prefix:
+                joined = "{0!r} + {1}".format(piece.prefix, joined)
+            if not single:
+                lines.append("    items = []")
+            for j, variable in enumerate(piece.variables):
+                name = "_v{0}_{1}".format(i, j)
+                if variable.items is not None:
+                    namespace[name] = variable.items
+                    lines.append("    items.extend({0})".format(name))
+                    continue
+                if memoise:
+                    namespace["_r" + name] = variable.render_memo
+                    setup.append("    {0} = _partial(_r{0}, memo={{}})".format(
+                        name))
+                else:
+                    namespace[name] = variable.render
+                safe = variable.safe or ""
+                if safe not in searches:
+                    searches[safe] = "_search{0}".format(len(searches))
+                    namespace[searches[safe]] = _encoding_table(safe)[0].search
+                lines.append("    v = values.get({0!r})".format(variable.name))
+                lines.append("    if v.__class__ is _text:")
+                if variable.max_length is not None:
+                    lines.append("        v = v[:{0}]".format(
+                        variable.max_length))
+                lines.append("        if {0}(v) is not None:".format(
+                    searches[safe]))
+                lines.append("            v = _encode(v, {0!r})".format(safe))
+                if variable.named:
+                    key = percent_encode(variable.name, variable.safe)
+                    if variable.trim_empty_equals:
+                        lines.append("        v = {0!r} + v if v else "
+                                     "{1!r}".format(key + "=", key))
+                    else:
+                        lines.append("        v = {0!r} + v".format(key + "="))
+                if single:
+                    if piece.prefix:
+                        lines.append("        p{0} = {1!r} + v".format(
+                            i, piece.prefix))
+                    else:
+                        lines.append("        p{0} = v".format(i))
+                    lines.append("    elif v is None:")
+                    lines.append("        p{0} = ''".format(i))
+                    lines.append("    else:")
+                    lines.append("        items = {0}(v)".format(name))
+                    lines.append("        p{0} = {1} if items else ''".format(
+                        i, joined))
+                else:
+                    lines.append("        items.append(v)")
+                    lines.append("    elif v is not None:")
+                    lines.append("        items.extend({0}(v))".format(name))
+            if not single:
+                lines.append("    p{0} = {1} if items else ''".format(
+                    i, joined))
+            pieces.append("p{0}".format(i))
+        if not pieces:
+            lines.append("    return ''")
+        else:
+            lines.append("    return ''.join(({0},))".format(
+                ", ".join(pieces)))
+        if memoise:
+            lines = setup + ["    " + line for line in lines]
+            lines.append("    return expand")
+        return "\n".join(lines) + "\n", namespace
 
-    _tokeniser = re.compile("(\{)([^{}]*)(\})")
+    #: Shared, compiled URITemplate instances returned by :py:meth:`get`.
+    #: The size can be changed through ``template_cache.max_size`` and hit,
+    #: miss and eviction counts are available as attributes.
+    template_cache = LRUCache(max_size=1024)
+
+    @classmethod
+    def get(cls, template):
+        """ Fetch a shared, compiled template for a template string from the
+        template cache, constructing and compiling it only if it is not
+        already there. Since the instance is shared, any cache enabled with
+        :py:meth:`use_cache` is shared along with it.
+        """
+        if template is None or isinstance(template, cls):
+            return cls.__cast(template)
+        template = ustr(template)
+        uri_template = cls.template_cache.get(template)
+        if uri_template is None:
+            uri_template = cls(template)
+            uri_template.compile()
+            cls.template_cache.put(template, uri_template)
+        return uri_template
+
+    @classmethod
+    def prewarm(cls, templates):
+        """ Load a number of template strings into the template cache, such
+        as at import time, returning the list of compiled templates.
+        """
+        return [cls.get(template) for template in templates]
 
     def __init__(self, template):
         super(URITemplate, self).__init__()
         self.__template = template
+        self.__function = None
+        self.__memoising = None
+        self.__matcher = None
+        self.__bound = None
+        self.__cache = None
+        if template is None:
+            self.__program = None
+        else:
+            self.__program = self._parse(ustr(template))
+
+    def __getstate__(self):
+        # The generated function and matcher are rebuilt on demand.
+        return self.__template, self.__program, self.__bound
+
+    def __setstate__(self, state):
+        self.__template, self.__program, self.__bound = state
+        self.__function = None
+        self.__memoising = None
+        self.__matcher = None
+        self.__cache = None
 
     def __eq__(self, other):
         other = self.__cast(other)
-        return self.__template == other.__template
+        return (self.__template == other.__template and
+                self.__bound == other.__bound)
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -164,20 +716,617 @@ class URITemplate(Part):
             return None
         return str(self.__template)
 
+    def compile(self):
+        """ Generate a Python function specialised for expanding this
+        template. The function takes the same keyword arguments as
+        :py:meth:`expand` but returns the expanded string rather than a URI.
+        The function is generated on first call and reused thereafter.
+        """
+        if self.__function is None:
+            self.__function = self.__load()
+        return self.__function
+
+    def __load(self, memoise=False):
+        if self.__program is None:
+            return lambda **values: None
+        source, namespace = self._generate(self.__program, memoise)
+        exec(compile(source, "<URITemplate {0!r}>".format(
+            self.__template), "exec"), namespace)
+        return namespace["load" if memoise else "expand"]
+
+    def partial(self, **values):
+        """ Expand only the variables supplied, returning a new template in
+        which the remaining variables are left open. Expressions whose
+        variables are all supplied become literal text and expressions
+        that can be split without changing their meaning are split. Any
+        other expression keeps its supplied variables as pre-rendered
+        items, which cannot be written in template syntax; such a template
+        will still show the original expression in its string.
+        """
+        if self.__program is None:
+            return self
+        program, bound = [], {}
+        values = dict(self.__bound or {}, **values)
+
+        def render(variable):
+            if variable.items is None:
+                return variable.render(values[variable.name])
+            return variable.items
+
+        def append(piece):
+            if isinstance(piece, text_type) and program and \
+                    isinstance(program[-1], text_type):
+                program[-1] += piece
+            elif piece != "":
+                program.append(piece)
+
+        for piece in self.__program:
+            if isinstance(piece, text_type):
+                append(piece)
+                continue
+            supplied = [variable.name in values
+                        for variable in piece.variables]
+            if not any(supplied):
+                append(piece)
+            elif all(supplied):
+                append(piece.expand(values))
+            elif piece.operator and piece.prefix == piece.separator:
+                # Each variable expands independently, with its own prefix.
+                for variable in piece.variables:
+                    if variable.name in values:
+                        append("".join(piece.prefix + item
+                                       for item in render(variable)))
+                    else:
+                        append(self._Expression(
+                            piece.operator + str(variable)))
+            elif piece.operator == "?" and supplied == sorted(supplied,
+                                                                reverse=True):
+                # A leading run of supplied query variables can be written
+                # out, leaving the rest to continue (or start) the query.
+                count = supplied.count(True)
+                items = []
+                for variable in piece.variables[:count]:
+                    items.extend(render(variable))
+                rest = ",".join(map(str, piece.variables[count:]))
+                if items:
+                    append("?" + "&".join(items))
+                    append(self._Expression("&" + rest))
+                else:
+                    append(self._Expression("?" + rest))
+            else:
+                expression = self._Expression(str(piece)[1:-1])
+                for variable, original in zip(expression.variables,
+                                              piece.variables):
+                    if variable.name in values:
+                        variable.items = render(original)
+                        bound[variable.name] = values[variable.name]
+                append(expression)
+        template = URITemplate(None)
+        template.__template = "".join(map(str, program))
+        template.__program = program
+        template.__bound = bound or None
+        return template
+
+    def expand_many(self, values):
+        """ Expand once for each mapping in the iterable `values`, yielding
+        the expanded strings. Each distinct (hashable) value of a variable
+        is encoded only once, as long as it is met again before a memo of
+        bounded size is emptied.
+        """
+        if self.__program is None:
+            for _ in values:
+                yield None
+            return
+        if self.__memoising is None:
+            self.__memoising = self.__load(memoise=True)
+        function = self.__memoising()
+        for mapping in values:
+            yield function(**mapping)
+
+    def expand_columns(self, columns, processes=None):
+        """ Expand once per row of a table held as columns, where `columns`
+        maps each variable name to a sequence of values and all sequences
+        are of the same length. A list of expanded strings is returned.
+
+        Each distinct value within a column is only encoded once. If
+        `processes` is given, rows are split into that many chunks and
+        expanded in a pool of worker processes.
+        """
+        columns = dict((name, list(column))
+                       for name, column in columns.items())
+        counts = set(map(len, columns.values()))
+        if len(counts) > 1:
+            raise ValueError("All columns must be of the same length")
+        count = counts.pop() if counts else 0
+        if self.__program is None:
+            return [None] * count
+        if processes and processes > 1 and count > processes:
+            size = -(-count // processes)
+            chunks = [(self, dict((name, column[i:i + size])
+                                  for name, column in columns.items()))
+                      for i in range(0, count, size)]
+            from multiprocessing import Pool
+            pool = Pool(processes)
+            try:
+                strings = []
+                for chunk in pool.map(_expand_columns, chunks):
+                    strings.extend(chunk)
+                return strings
+            finally:
+                pool.close()
+                pool.join()
+        pieces = [
+            repeat(piece, count) if isinstance(piece, text_type)
+            else piece.expand_all(columns, count)
+            for piece in self.__program
+        ]
+        return ["".join(row) for row in zip(*pieces)]
+
+    def expand_product(self, **iterables):
+        """ Expand for every combination of the values supplied for each
+        variable, varying fastest the variable that appears last in the
+        template. The result is a lazy sequence of strings that supports
+        :py:func:`len`, indexing and slicing, so that work can be resumed
+        from an offset or split into ranges. Each value is encoded only
+        once, however many combinations it appears in.
+        """
+        return self._Product(self.__program, iterables)
+
+    def match(self, uri):
+        """ Attempt to reverse an expansion, returning a dictionary of the
+        variable values that this template would expand into `uri`, or
+        :py:const:`None` if it could not have produced it. Variables that
+        would have expanded to nothing are omitted, lists are recovered from
+        exploded variables and unknown keys within a named, exploded
+        expression are gathered into a dictionary. Where adjacent
+        expressions are ambiguous, earlier expressions match greedily.
+        """
+        if self.__program is None:
+            return None
+        if isinstance(uri, URI):
+            uri = uri.string
+        if uri is None:
+            return None
+        if self.__matcher is None:
+            self.__matcher = [
+                piece if isinstance(piece, text_type) else piece.scanner()
+                for piece in self.__program
+            ]
+        texts = _scan(self.__matcher, ustr(uri))
+        if texts is None:
+            return None
+        values = {}
+        expressions = [piece for piece in self.__program
+                       if not isinstance(piece, text_type)]
+        try:
+            for expression, text in zip(expressions, texts):
+                if not expression.bind(text, values):
+                    return None
+        except UnicodeDecodeError:
+            return None
+        return values
+
+    def _route_keys(self):
+        """ Return the keys under which a router files this template, along
+        with whether they cover its whole path. There is one key for each
+        leading segment, being either the literal text of the segment or
+        :py:const:`None` for a segment made up of a single simple variable.
+        Keys stop at the first segment that is neither.
+        """
+        keys = []
+        segment, variable = "", False
+        for piece in self.__program or ():
+            if isinstance(piece, text_type):
+                path = self._path_end.split(piece, maxsplit=1)
+                parts = path[0].split("/")
+                for part in parts[:-1]:
+                    segment += part
+                    if variable and segment:
+                        return keys, False
+                    keys.append(None if variable else segment)
+                    segment, variable = "", False
+                segment += parts[-1]
+                if len(path) > 1:
+                    break
+            elif piece.operator in ("?", "#"):
+                break
+            elif (variable or segment or piece.operator or
+                    len(piece.variables) != 1 or piece.variables[0].explode):
+                return keys, False
+            else:
+                variable = True
+        if variable and segment:
+            return keys, False
+        keys.append(None if variable else segment)
+        return keys, True
+
+    _path_end = re.compile(r"[?#]")
+
+    @property
+    def cache(self):
+        """ The :py:class:`LRUCache` of expanded strings for this template,
+        or :py:const:`None` if expansions are not being cached.
+        """
+        return self.__cache
+
+    def use_cache(self, max_size=1024):
+        """ Cache up to `max_size` expanded strings for this template, keyed
+        on the values of the variables it uses, or stop caching if
+        `max_size` is zero or :py:const:`None`. Values that cannot be
+        reduced to a hashable key are always expanded afresh. Returns the
+        template itself.
+        """
+        if not max_size:
+            self.__cache = None
+        elif self.__cache is None:
+            self.__cache = LRUCache(max_size)
+            self.__cache_names = tuple(sorted(set(
+                variable.name
+                for piece in self.__program or ()
+                if not isinstance(piece, text_type)
+                for variable in piece.variables
+                if variable.items is None
+            )))
+        else:
+            self.__cache.max_size = max_size
+        return self
+
     def expand(self, **values):
         """ Expand into a URI using the values supplied
         """
-        if self.__template is None:
-            return URI(None)
-        tokens = self._tokeniser.split(self.__template)
-        expander = URITemplate._Expander(values)
-        out = []
-        while tokens:
-            token = tokens.pop(0)
-            if token == "{":
-                expression = tokens.pop(0)
-                tokens.pop(0)
-                out.append(expander.expand(expression))
+        if self.__cache is not None:
+            return URI(self.expand_string(**values))
+        return URI(self.__expand(values))
+
+    def expand_string(self, **values):
+        """ Expand into a string using the values supplied, without parsing
+        the result into a URI.
+        """
+        cache = self.__cache
+        if cache is None:
+            return self.compile()(**values)
+        try:
+            key = tuple(_cache_key(values.get(name))
+                        for name in self.__cache_names)
+        except TypeError:
+            return self.compile()(**values)
+        string = cache.get(key)
+        if string is None:
+            string = self.compile()(**values)
+            cache.put(key, string)
+        return string
+
+    def expand_to(self, stream, **values):
+        """ Expand using the values supplied, writing the result piece by
+        piece to `stream`, which may be any object with a `write` method
+        such as a :py:class:`io.StringIO`. Composite values may be any
+        mapping or iterable, including generators, and are consumed as
+        the expansion is written rather than being collected first.
+        """
+        if self.__program is None:
+            return
+        write = stream.write
+        for piece in self.__program:
+            if isinstance(piece, text_type):
+                write(piece)
+            else:
+                piece.write(write, values)
+
+    def expand_bytes(self, **values):
+        """ Expand into an ASCII byte string using the values supplied. Any
+        non-ASCII characters in the template's literal text are
+        percent-encoded as UTF-8.
+        """
+        string = self.expand_string(**values)
+        if string is None:
+            return None
+        try:
+            return string.encode("ascii")
+        except UnicodeEncodeError:
+            return self._non_ascii.sub(lambda matched: percent_encode(
+                matched.group(0)), string).encode("ascii")
+
+    def __expand(self, values):
+        if self.__program is None:
+            return None
+        return "".join(
+            piece if isinstance(piece, text_type) else piece.expand(values)
+            for piece in self.__program
+        )
+
+
+def _is_composite(value):
+    # Anything iterable other than a string counts as a composite value.
+    # URIs and their parts iterate over their strings, so they are taken
+    # as strings too, along with anything else that offers a URI.
+    return (hasattr(value, "__iter__") and
+            not isinstance(value, (text_type, bytes, bytearray, Part)) and
+            not hasattr(value, "__uri__"))
+
+
+def _scan(matcher, uri):
+    # Divide `uri` between the pieces of a template, as described by
+    # `URITemplate.match`, returning the text taken by each expression or
+    # None if the pieces cannot account for all of it. Earlier expressions
+    # take as much text as they can. Rather than backtracking, which takes
+    # polynomial time over adjacent expressions, this first works back from
+    # the end to find each position at which each piece could start and
+    # still leave a match for the rest, in time linear in the length of
+    # `uri` for each piece.
+    size = len(uri)
+    # Positions just after a '%' or the character after it, where text
+    # holding that '%' as an escape cannot end.
+    split = bytearray(size + 1)
+    at = uri.find("%")
+    while at != -1:
+        for q in (at + 1, at + 2):
+            if q <= size:
+                split[q] = 1
+        at = uri.find("%", at + 1)
+    runs, separators = {}, {}
+
+    def span(scanner, start):
+        # The first and last positions at which non-empty text for an
+        # expression starting at `start` could end.
+        prefix, chars, separator, limit = scanner
+        if not uri.startswith(prefix, start):
+            return None
+        first = start + len(prefix)
+        try:
+            run = runs[chars]
+        except KeyError:
+            run = runs[chars] = _run_ends(uri, chars)
+        last = run[first]
+        if limit is not None:
+            try:
+                positions = separators[separator]
+            except KeyError:
+                positions = separators[separator] = [
+                    i for i, char in enumerate(uri) if char == separator]
+            i = bisect_left(positions, first) + limit
+            if i < len(positions) and positions[i] < last:
+                last = positions[i]
+        return first, last
+
+    def can_end(q, first, after):
+        # Text starting at `first` can only end within an escape if the
+        # escape's '%' comes before it.
+        if not after[q]:
+            return False
+        if q >= first + 2:
+            return not split[q]
+        return q == first or uri[first] != "%"
+
+    # The positions at which each piece could start, working backwards.
+    starts = [None] * len(matcher) + [bytearray(size + 1)]
+    starts[-1][size] = 1
+    for index in range(len(matcher) - 1, -1, -1):
+        piece, after = matcher[index], starts[index + 1]
+        here = bytearray(size + 1)
+        if isinstance(piece, text_type):
+            at = uri.find(piece)
+            while at != -1:
+                if after[at + len(piece)]:
+                    here[at] = 1
+                at = uri.find(piece, at + 1)
+        else:
+            # A running count of possible end positions, so that a whole
+            # span of them can be checked at once.
+            counts = [0]
+            for q in range(size + 1):
+                counts.append(counts[-1] + (after[q] and not split[q]))
+            for start in range(size + 1):
+                if after[start]:
+                    here[start] = 1
+                    continue
+                bounds = span(piece, start)
+                if bounds is None:
+                    continue
+                first, last = bounds
+                if (can_end(first, first, after) or
+                        first < last and can_end(first + 1, first, after) or
+                        counts[last + 1] > counts[min(first + 2, last + 1)]):
+                    here[start] = 1
+        starts[index] = here
+    if not starts[0][0]:
+        return None
+    # Then take the longest text for each expression in turn that still
+    # leaves a match for the rest.
+    texts, start = [], 0
+    for index, piece in enumerate(matcher):
+        after = starts[index + 1]
+        if isinstance(piece, text_type):
+            start += len(piece)
+            continue
+        end = start
+        bounds = span(piece, start)
+        if bounds is not None:
+            first, last = bounds
+            for q in range(last, first - 1, -1):
+                if can_end(q, first, after):
+                    end = q
+                    break
+        texts.append(uri[start:end])
+        start = end
+    return texts
+
+
+def _run_ends(uri, chars):
+    # For each position in `uri`, the end of the longest run of characters
+    # from `chars` and escapes starting there.
+    size = len(uri)
+    ends = [size] * (size + 1)
+    for q in range(size - 1, -1, -1):
+        char = uri[q]
+        if char in chars:
+            ends[q] = ends[q + 1]
+        elif (char == "%" and q + 2 < size and uri[q + 1] in _hex_digits and
+                uri[q + 2] in _hex_digits):
+            ends[q] = ends[q + 3]
+        else:
+            ends[q] = q
+    return ends
+
+
+_hex_digits = frozenset("0123456789ABCDEFabcdef")
+
+
+# The number of results a memo holds before it is emptied.
+_memo_size = 4096
+
+
+def _memoised(encode):
+    # Wrap a percent-encoding function with a bounded memo of its results.
+    memo = {}
+
+    def encode_memo(value, safe):
+        try:
+            return memo[value, safe]
+        except KeyError:
+            if len(memo) >= _memo_size:
+                memo.clear()
+            encoded = memo[value, safe] = encode(value, safe)
+            return encoded
+
+    return encode_memo
+
+
+# Python 2 pickles classes by their plain name alone, so the classes that
+# make up a template's program are made available under those names too.
+_Variable = URITemplate._Variable
+_Expression = URITemplate._Expression
+
+
+# Types whose values can be used in cache keys as they are.
+_scalar_types = frozenset([text_type, bytes, int, float, bool, type(None)])
+
+
+def _cache_key(value):
+    # Reduce a variable value to a hashable key which distinguishes every
+    # value that could expand differently, including by type (so that 1
+    # and True differ) and by the order of dictionary items. Values that
+    # cannot be hashed, or that could only be keyed by consuming them,
+    # raise TypeError.
+    if value.__class__ in _scalar_types:
+        return value.__class__, value
+    elif isinstance(value, Iterator):
+        raise TypeError("Iterators cannot be used as cache keys")
+    elif isinstance(value, Mapping):
+        return dict, tuple((_cache_key(key), _cache_key(item))
+                           for key, item in value.items())
+    elif isinstance(value, (tuple, list)):
+        return list, tuple(map(_cache_key, value))
+    else:
+        hash(value)
+        return value.__class__, value
+
+
+def _expand_columns(args):
+    # Worker for `URITemplate.expand_columns` in a process pool.
+    template, columns = args
+    return template.expand_columns(columns)
+
+
+class URITemplateRouter(object):
+    """ A collection of URI Templates against which URIs can be dispatched.
+
+    Templates are filed in a trie keyed on their path segments, with a
+    wildcard branch for segments consisting of a single simple variable,
+    so that only templates whose literal segments agree with a URI are ever
+    tried against it. Templates whose every path segment can be keyed are
+    only tried against URIs with exactly those segments; others are tried
+    against any URI that starts with the segments they have. Literal
+    branches are preferred to wildcards, deeper templates to shallower ones
+    and otherwise templates are tried in the order they were added.
+    """
+
+    __slots__ = ("__templates", "__root")
+
+    class _Node(object):
+
+        __slots__ = ("literals", "wildcard", "templates", "complete")
+
+        def __init__(self):
+            self.literals = {}
+            self.wildcard = None
+            # Templates whose whole path ends here, and those that can
+            # carry on into further segments.
+            self.complete = []
+            self.templates = []
+
+    def __init__(self, templates=()):
+        self.__templates = []
+        self.__root = None
+        for template in templates:
+            self.add(template)
+
+    def __len__(self):
+        return len(self.__templates)
+
+    def __iter__(self):
+        return iter(self.__templates)
+
+    def add(self, template):
+        """ Add a template, returning it as a :py:class:`URITemplate`. The
+        router will need to be recompiled before its next dispatch.
+        """
+        if not isinstance(template, URITemplate):
+            template = URITemplate(template)
+        self.__templates.append(template)
+        self.__root = None
+        return template
+
+    def compile(self):
+        """ Build the dispatch trie. This is done automatically on the first
+        call to :py:meth:`match` but may be called up front to avoid that
+        cost landing on the first request.
+        """
+        root = self._Node()
+        for template in self.__templates:
+            node = root
+            keys, complete = template._route_keys()
+            for key in keys:
+                if key is None:
+                    if node.wildcard is None:
+                        node.wildcard = self._Node()
+                    node = node.wildcard
+                else:
+                    node = node.literals.setdefault(key, self._Node())
+            if complete:
+                node.complete.append(template)
             else:
-                out.append(token)
-        return URI("".join(out))
+                node.templates.append(template)
+        self.__root = root
+        return self
+
+    def match(self, uri):
+        """ Find the template that matches `uri`, returning a tuple of that
+        template and the variable values extracted from it, or
+        :py:const:`None` if no template matches.
+        """
+        if self.__root is None:
+            self.compile()
+        if isinstance(uri, URI):
+            uri = uri.string
+        if uri is None:
+            return None
+        uri = ustr(uri)
+        segments = URITemplate._path_end.split(uri, maxsplit=1)[0].split("/")
+        return self.__search(self.__root, segments, 0, uri)
+
+    def __search(self, node, segments, i, uri):
+        if i < len(segments):
+            for child in (node.literals.get(segments[i]), node.wildcard):
+                if child is not None:
+                    found = self.__search(child, segments, i + 1, uri)
+                    if found is not None:
+                        return found
+            # Templates filed here go on to a further segment.
+            templates = node.templates
+        else:
+            templates = node.complete
+        for template in templates:
+            values = template.match(uri)
+            if values is not None:
+                return template, values
+        return None
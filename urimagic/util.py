@@ -16,10 +16,15 @@
 # limitations under the License.
 
 
+from threading import Lock
+
+
 try:
     unicode
 except NameError:
     # Python 3
+    text_type = str
+
     def ustr(s, encoding="utf-8"):
         if isinstance(s, str):
             return s
@@ -29,8 +34,149 @@ except NameError:
             return str(s)
 else:
     # Python 2
+    text_type = unicode
+
     def ustr(s, encoding="utf-8"):
         if isinstance(s, str):
             return s.decode(encoding)
         else:
             return unicode(s)
+
+
+try:
+    view_types = (memoryview,)
+except NameError:
+    # Python 2.6: an empty tuple makes every isinstance check fail.
+    view_types = ()
+
+
+class _OrderedEntries(dict):
+    """ The parts of an ordered dictionary used by :py:class:`LRUCache`,
+    for Python 2.6, which has no `collections.OrderedDict`. Keys are kept
+    in a circular doubly linked list of [previous, next, key] links.
+    """
+
+    def __init__(self):
+        dict.__init__(self)
+        self.__root = root = []
+        root[:] = [root, root, None]
+        self.__links = {}
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            root = self.__root
+            last = root[0]
+            last[1] = root[0] = self.__links[key] = [last, root, key]
+        dict.__setitem__(self, key, value)
+
+    def pop(self, key, *default):
+        link = self.__links.pop(key, None)
+        if link is not None:
+            previous, following = link[0], link[1]
+            previous[1], following[0] = following, previous
+        return dict.pop(self, key, *default)
+
+    def popitem(self, last=True):
+        if not self:
+            raise KeyError("dictionary is empty")
+        key = self.__root[0][2] if last else self.__root[1][2]
+        return key, self.pop(key)
+
+    def clear(self):
+        dict.clear(self)
+        self.__links.clear()
+        self.__root[:] = [self.__root, self.__root, None]
+
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    # Python 2.6
+    OrderedDict = _OrderedEntries
+
+
+class LRUCache(object):
+    """ A thread-safe mapping of bounded size which discards the least
+    recently used entries first. Counts of hits, misses and evictions are
+    kept for monitoring:
+
+    >>> cache = LRUCache(max_size=2)
+    >>> cache.put("a", 1)
+    >>> cache.put("b", 2)
+    >>> cache.get("a")
+    1
+    >>> cache.put("c", 3)
+    >>> cache.get("b") is None
+    True
+    >>> cache.hits, cache.misses, cache.evictions
+    (1, 1, 1)
+
+    """
+
+    def __init__(self, max_size=1024):
+        self.__entries = OrderedDict()
+        self.__lock = Lock()
+        self.__max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def __repr__(self):
+        return "<{0} size={1} max_size={2} hits={3} misses={4} " \
+               "evictions={5}>".format(self.__class__.__name__, len(self),
+                                       self.__max_size, self.hits,
+                                       self.misses, self.evictions)
+
+    @property
+    def max_size(self):
+        """ The maximum number of entries held; setting this to a lower
+        value evicts entries straight away.
+        """
+        return self.__max_size
+
+    @max_size.setter
+    def max_size(self, value):
+        with self.__lock:
+            self.__max_size = value
+            self.__evict()
+
+    def __evict(self):
+        while len(self.__entries) > self.__max_size:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        """ Fetch the value cached for `key`, marking it as most recently
+        used, or return `default` if there is none.
+        """
+        with self.__lock:
+            try:
+                value = self.__entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.__entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """ Cache a value for `key`, evicting the least recently used entry
+        if the cache is full.
+        """
+        with self.__lock:
+            self.__entries.pop(key, None)
+            self.__entries[key] = value
+            self.__evict()
+
+    def clear(self):
+        """ Remove all entries and reset the counters.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.hits = self.misses = self.evictions = 0